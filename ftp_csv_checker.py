@@ -3,27 +3,23 @@
 from pathlib import Path
 from typing import Union
 
-import pandas as pd
 import typer
-from ftp_downloader import FTPDownloader
+from ftp_downloader import FTPDownloader, read_sync_csv
 
 
 def main(csv_path: Union[Path, str] = typer.Argument(..., help="CSV filepath")):
-    sync_info_df = pd.read_csv(csv_path)
-    sync_info_df.fillna("", inplace=True)
+    sync_info = read_sync_csv(csv_path)
 
     # downloaders: List[FTPDownloader] = list()
-    for item in sync_info_df.itertuples(index=False):
-        host, user, passwd, cwd, local_root, file_reg = item
-
+    for host, user, passwd, cwd, local_root, file_reg in sync_info:
         # print(host, user, passwd, cwd, local_root, file_reg)
         downloader = FTPDownloader(
             host=host,
             cwd=cwd,
             local_root=local_root,
             file_reg=file_reg,
-            user=str(user),
-            passwd=str(passwd),
+            user=user,
+            passwd=passwd,
         )
         try:
             print("===========  File list to sync: ===========")
@@ -1,12 +1,69 @@
 # -*- coding: utf-8 -*-
 """ A module for FTPDownloader class implementation and test"""
+import asyncio
+import csv
+import json
 import logging
 import os
 import re
-import shutil
+import socket
+import ssl
+import tempfile
+import threading
+import time
 import timeit
-from ftplib import FTP
-from typing import List
+from ftplib import FTP, FTP_TLS, error_perm
+from typing import Dict, List, Tuple, Union
+
+_MANIFEST_FILENAME = ".sync_manifest.json"
+# the manifest of a `local_root` is shared by all the downloaders (CSV rows) of that directory, their saves are serialized
+_MANIFEST_LOCK = threading.Lock()
+_MAX_ATTEMPTS = 3  # maximum number of attempts to download a file
+
+
+class TunedFTP(FTP):
+    """An `ftplib.FTP` whose data connections are tuned for bulk downloads: a larger kernel receive buffer (`SO_RCVBUF`) to let the TCP window grow on high bandwidth-delay links, and `TCP_NODELAY` enabled"""
+
+    def __init__(self, *args, rcvbuf_size: int = 4 << 20, **kwargs):
+        self.rcvbuf_size = rcvbuf_size
+        super().__init__(*args, **kwargs)
+
+    def ntransfercmd(self, cmd, rest=None):
+        conn, size = super().ntransfercmd(cmd, rest)
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf_size)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn, size
+
+    def retr_to_fd(self, cmd: str, fd: int, blocksize: int = 262144, rest=None) -> str:
+        """Retrieve a file in binary mode like `retrbinary`, but the data is received straight into a preallocated buffer and written into the file descriptor `fd`, there is no Python callback per block
+
+        Args:
+            cmd (str): A RETR command
+            fd (int): The file descriptor to write the data into
+            blocksize (int, optional): The size of the receiving buffer. Defaults to 262144
+            rest (optional): Passed to `transfercmd`. Defaults to None
+
+        Returns:
+            str: The response of the server
+        """
+        self.voidcmd("TYPE I")
+        buf = bytearray(blocksize)
+        view = memoryview(buf)
+        with self.transfercmd(cmd, rest) as conn:
+            while True:
+                n = conn.recv_into(buf)
+                if not n:
+                    break
+                written = 0
+                while written < n:
+                    written += os.write(fd, view[written:n])
+            if isinstance(conn, ssl.SSLSocket):
+                conn.unwrap()
+        return self.voidresp()
+
+
+class TunedFTP_TLS(TunedFTP, FTP_TLS):
+    """The TLS (FTPS) version of `TunedFTP`"""
 
 
 class FTPDownloader:
@@ -23,6 +80,11 @@ class FTPDownloader:
         file_reg: str = ".+",
         user: str = "",
         passwd: str = "",
+        tls: bool = False,
+        block_size: int = 262144,
+        rcvbuf_size: int = 4 << 20,
+        parallel_per_host: int = 4,
+        manifest_ttl: float = 86400,
     ):
         """Initialize the `FTPDownloader` class
 
@@ -33,13 +95,50 @@ class FTPDownloader:
             file_reg (str, optional): A regular expression to match the files that is going to sync. Defaults to ".+", means to sync all files in the remote to local.
             user (str, optional): username to connect the FTP server, Defaults to ""
             passwd (str, optional): password to connect the FTP server, Defaults to ""
+            tls (bool, optional): whether to connect the FTP server over TLS (FTPS), both the control and data channels are encrypted. Defaults to False
+            block_size (int, optional): the maximum chunk size (in bytes) read from the data connection at a time when downloading a file, larger block sizes mean less system calls on fast links. Defaults to 262144 (256 KB)
+            rcvbuf_size (int, optional): the kernel receive buffer size (in bytes) of the data connection, it should be about twice the bandwidth-delay product of the link. Defaults to 4 MB
+            parallel_per_host (int, optional): the default number of files downloaded in parallel from the host, each over its own FTP connection. Typical servers allow 4-8 simultaneous connections. Defaults to 4
+            manifest_ttl (float, optional): the remote sizes of the downloaded files are recorded in a manifest file `.sync_manifest.json` in `local_root`. Within `manifest_ttl` seconds after a file is downloaded, it is considered unchanged in "auto" mode as long as its local size matches the manifest, so no `SIZE` command is sent for it on servers without `MLSD` support. Defaults to 86400 (1 day)
         """
         self.host = host
         self.user = user
         self.passwd = passwd
         self.cwd = cwd
         self.file_reg = file_reg
+        self._file_re = re.compile(file_reg)  # compiled once, reused for every filename
         self.local_root = local_root
+        self.tls = tls
+        self.block_size = block_size
+        self.rcvbuf_size = rcvbuf_size
+        self.parallel_per_host = parallel_per_host
+        self.manifest_ttl = manifest_ttl
+        self._manifest_path = os.path.join(local_root, _MANIFEST_FILENAME)
+        self._manifest = self._load_manifest()  # filename -> {"size": remote size, "mtime": download time}
+        self._manifest_updated = set()  # the files downloaded by this downloader since the last save
+
+    def _login(self) -> FTP:
+        """Open a new connection to the FTP server and login, the connection stays in the login (home) directory
+
+        Returns:
+            FTP: The logged in TunedFTP (or TunedFTP_TLS) connection
+        """
+        ftp_cls = TunedFTP_TLS if self.tls else TunedFTP
+        ftp = ftp_cls(self.host, rcvbuf_size=self.rcvbuf_size)
+        ftp.login(user=self.user, passwd=self.passwd)
+        if self.tls:
+            ftp.prot_p()  # secure the data connection as well
+        return ftp
+
+    def _connect(self) -> FTP:
+        """Open a new connection to the FTP server, login and change to the remote directory `cwd`
+
+        Returns:
+            FTP: The logged in TunedFTP (or TunedFTP_TLS) connection
+        """
+        ftp = self._login()
+        ftp.cwd(self.cwd)
+        return ftp
 
     def files_to_sync(
         self,
@@ -49,15 +148,8 @@ class FTPDownloader:
         Returns:
             List[str]: matched_files The list of files that are going to sync
         """
-        matched_files = []
-        with FTP(host=self.host) as ftp:
-            ftp.login(user=self.user, passwd=self.passwd)
-            ftp.cwd(self.cwd)
-            files = ftp.nlst()
-            for file in files:
-                match = re.fullmatch(self.file_reg, file)  # match
-                if match:
-                    matched_files.append(file)
+        with self._connect() as ftp:
+            matched_files = self._nlst_matched(ftp)
         return matched_files
 
     def files_to_update(self, sync_mode: str = "auto") -> List[str]:
@@ -69,32 +161,18 @@ class FTPDownloader:
         Returns:
             List[str]: matched_files The list of files that are going to download
         """
-        matched_files = list()
         assert sync_mode in [
             "auto",
             "override",
             "no_override",
         ], f"The input argument must be one of 'auto', 'override' and 'no_override'."
 
-        with FTP(self.host) as ftp:
-            ftp.login(user=self.user, passwd=self.passwd)
-            ftp.cwd(self.cwd)
-            files = ftp.nlst()  # list the files on remote server
-
-            for file in files:
-                match = re.fullmatch(self.file_reg, file)  # match
-                if match:  # if filename match the given regular expression
-                    filepath = os.path.join(self.local_root, file)
-                    if os.path.exists(filepath):  # file exists
-                        if sync_mode == "no_override":
-                            continue
-                        if sync_mode == "auto":
-                            if os.stat(filepath).st_size == ftp.size(file):  # check if the file size is equal
-                                continue
-                    matched_files.append(file)
+        local_sizes = self._local_sizes()
+        with self._connect() as ftp:
+            matched_files, _ = self._files_to_download(ftp, sync_mode, local_sizes)
         return matched_files
 
-    def run(self, sync_mode: str = "auto") -> None:
+    def run(self, sync_mode: str = "auto", concurrency: int = None) -> None:
         """
         Start to sync files that match given regular pattern in the remote FTP directory ioto the local folder
 
@@ -105,49 +183,348 @@ class FTPDownloader:
             - if it is "auto", the syncer will automatically check the file sizes on both remote and local, download and override the local file only if they are different.
             - if it is "override", the syncer will override the local file without file size check.
             - if it is "no_override", the syncer will never override the exsiting file.
+            concurrency (int, optional): Number of persistent FTP connections used to download files in parallel. Defaults to None, which means `parallel_per_host`.
+        """
+        asyncio.run(self.run_async(sync_mode=sync_mode, concurrency=concurrency))
+
+    async def run_async(self, sync_mode: str = "auto", concurrency: int = None) -> None:
+        """The asynchronous version of `run`. The files to download are put into a queue (the largest first), and `concurrency` workers, each one holding its own persistent FTP connection, pull files from the queue and download them in parallel
+
+        Args:
+            sync_mode (str, optional): See `sync_mode` argument in function `run`
+            concurrency (int, optional): See `concurrency` argument in function `run`
+        """
+        await FTPDownloader.run_many_async([self], sync_mode=sync_mode, concurrency=concurrency)
+
+    @staticmethod
+    def run_many(downloaders: List["FTPDownloader"], sync_mode: str = "auto", concurrency: int = None) -> None:
+        """Run several downloaders that login to the same FTP server with the same account, such as the downloaders of different remote directories in the same server. Compared to calling `run` of each downloader, the downloaders share one pool of persistent FTP connections, which saves a login per downloader and keeps all the connections busy until every file is downloaded
+
+        Args:
+            downloaders (List[FTPDownloader]): The downloaders to run, all of them must have the same `host`, `user`, `passwd` and `tls`
+            sync_mode (str, optional): See `sync_mode` argument in function `run`
+            concurrency (int, optional): Number of persistent FTP connections. Defaults to None, which means `parallel_per_host` of the first downloader.
+        """
+        asyncio.run(FTPDownloader.run_many_async(downloaders, sync_mode=sync_mode, concurrency=concurrency))
+
+    @staticmethod
+    async def run_many_async(
+        downloaders: List["FTPDownloader"], sync_mode: str = "auto", concurrency: int = None
+    ) -> None:
+        """The asynchronous version of `run_many`
+
+        Args:
+            downloaders (List[FTPDownloader]): See `downloaders` argument in function `run_many`
+            sync_mode (str, optional): See `sync_mode` argument in function `run`
+            concurrency (int, optional): See `concurrency` argument in function `run_many`
         """
         assert sync_mode in [
             "auto",
             "override",
             "no_override",
         ], f"The input argument must be one of 'auto', 'override' and 'no_override'."
-        os.makedirs(self.local_root, exist_ok=True)  # create local directory if it is not exists
+        if not downloaders:
+            return
+        first = downloaders[0]
+        assert all(
+            downloader._login_key == first._login_key for downloader in downloaders
+        ), "All the downloaders must login to the same FTP server with the same account."
 
-        ftp = FTP(self.host)
-        ftp.login(user=self.user, passwd=self.passwd)
-        ftp.cwd(self.cwd)
-        files = ftp.nlst()  # list the files on remote server
-
-        for file in files:
-            match = re.fullmatch(self.file_reg, file)  # match
-            if match:  # if filename match the given regular expression
-                filepath = os.path.join(self.local_root, file)
-                filepath_cache = os.path.join(self.local_root, file + ".1")
-                if os.path.exists(filepath):  # file exists
-                    if sync_mode == "no_override":
-                        logging.info(f"{filepath} already exists and won't be update in `no_override` mode.")
-                        continue
-                    if (sync_mode == "auto") and (os.stat(filepath).st_size == ftp.size(file)):
-                        # the mode is 'auto' and the file size is equal, no need to update
-                        # logging.info(f"{filepath} already up to date.")
-                        continue
-                logging.info(f"Downloading file {file} to {filepath} ...")
+        ftp = await asyncio.to_thread(first._login)
+        connections = [ftp]  # closed at the end, also when the listing or a worker fails
+        try:
+            home = await asyncio.to_thread(ftp.pwd)
+            jobs = list()  # (remote size, downloader, file)
+            for downloader in downloaders:
+                # a failed listing skips the files of this downloader only, not the other directories of the host
                 try:
-                    start = timeit.default_timer()
-                    ftp.retrbinary("RETR " + file, open(filepath_cache, "wb").write)
-                    if os.path.exists(filepath):
-                        os.remove(filepath)
-                    shutil.move(src=filepath_cache, dst=filepath)
-                    stop = timeit.default_timer()
-                    logging.info(f"Time used {stop - start:.0f}s for downloading file {file}")
+                    os.makedirs(downloader.local_root, exist_ok=True)  # create local directory if it is not exists
+                    local_sizes = downloader._local_sizes()
+                    if sync_mode == "no_override":
+                        num_existing = sum(1 for file in local_sizes if downloader._file_re.fullmatch(file))
+                        logging.info(
+                            "%d files already exist in %s and won't be update in `no_override` mode.",
+                            num_existing,
+                            downloader.local_root,
+                        )
+                    await asyncio.to_thread(_change_dir, ftp, home, downloader.cwd)
+                    files, sizes = await asyncio.to_thread(downloader._files_to_download, ftp, sync_mode, local_sizes)
                 except Exception as e:
-                    # re-login
-                    ftp.close()
-                    ftp = FTP(self.host)
-                    ftp.login(user=self.user, passwd=self.passwd)
-                    ftp.cwd(self.cwd)
-                    logging.info(f"Exception happens when download {file} to {filepath}\n {e}")
-                    logging.info(f"Time used {stop - start:.0f}s for downloading file {filepath_cache}")
+                    logging.info(
+                        "Failed to list the remote directory %s of %s\n %s", downloader.cwd, downloader.host, e
+                    )
+                    ftp = connections[0] = await asyncio.to_thread(downloader._reconnect, ftp)
+                    continue
+                jobs.extend((sizes[file], downloader, file) for file in files)
+            if not jobs:
+                return
+
+            # the largest files go first, so that the workers finish their last downloads at roughly the same time
+            queue: asyncio.Queue = asyncio.Queue()
+            for size, downloader, file in sorted(jobs, key=lambda job: job[0], reverse=True):
+                queue.put_nowait((downloader, file, size))
+
+            if concurrency is None:
+                concurrency = first.parallel_per_host
+            num_workers = max(1, min(concurrency, len(jobs)))
+            logins = await asyncio.gather(
+                *[asyncio.to_thread(first._login) for _ in range(num_workers - 1)], return_exceptions=True
+            )
+            # a server limiting the connections per account may refuse some logins, run with the accepted ones only
+            for login in logins:
+                if isinstance(login, Exception):
+                    logging.info("Failed to open an extra connection to %s\n %s", first.host, login)
+                else:
+                    connections.append(login)
+            await asyncio.gather(*[FTPDownloader._worker(conn, home, queue) for conn in connections])
+            for downloader in downloaders:
+                downloader._save_manifest()
+        finally:
+            for conn in connections:
+                await asyncio.to_thread(conn.close)
+
+    @property
+    def _login_key(self) -> Tuple[str, str, str, bool]:
+        """The downloaders of the same key can share their FTP connections"""
+        return (self.host, self.user, self.passwd, self.tls)
+
+    def _local_sizes(self) -> Dict[str, int]:
+        """Return the sizes of the files already in `local_root`, collected in a single directory scan"""
+        if not os.path.isdir(self.local_root):
+            return dict()
+        with os.scandir(self.local_root) as entries:
+            return {
+                entry.name: entry.stat().st_size
+                for entry in entries
+                if entry.is_file() and entry.name != _MANIFEST_FILENAME
+            }
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        """Load the manifest of the downloaded files, an empty one will be returned if the manifest doesn't exist or is broken"""
+        try:
+            with open(self._manifest_path) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return dict()
+
+    def _save_manifest(self) -> None:
+        """Merge the entries of the files downloaded by this downloader into the manifest file and write it atomically. The file is re-read under a lock, so that the entries saved by the other downloaders of the same `local_root` are kept"""
+        if not self._manifest_updated:
+            return
+        with _MANIFEST_LOCK:
+            manifest = self._load_manifest()
+            manifest.update((file, self._manifest[file]) for file in self._manifest_updated)
+            # a unique temporary file, the downloaders of different hosts may save into the same directory
+            with tempfile.NamedTemporaryFile("w", dir=self.local_root, suffix=".tmp", delete=False) as fh:
+                json.dump(manifest, fh)
+            os.replace(fh.name, self._manifest_path)
+        self._manifest = manifest
+        self._manifest_updated.clear()
+
+    def _nlst_matched(self, ftp: FTP) -> List[str]:
+        """List the remote files that match the given pattern. The names are filtered while they are streamed from the data connection, so only the matched ones are kept in memory"""
+        matched_files = list()
+
+        def collect(name: str):
+            if self._file_re.fullmatch(name):
+                matched_files.append(name)
+
+        ftp.retrlines("NLST", collect)
+        return matched_files
+
+    def _mlsd_sizes(self, ftp: FTP) -> Dict[str, int]:
+        """List the remote files that match the given pattern together with their sizes with a single `MLSD` command. Like `_nlst_matched`, the entries are parsed and filtered while they are streamed"""
+        sizes = dict()
+
+        def collect(line: str):
+            facts_found, _, name = line.partition(" ")
+            if not self._file_re.fullmatch(name):
+                return
+            facts = dict()
+            for fact in facts_found.split(";"):
+                key, _, value = fact.partition("=")
+                facts[key.lower()] = value
+            if facts.get("type") == "file":
+                sizes[name] = int(facts.get("size", 0))
+
+        ftp.sendcmd("OPTS MLST size;type;")
+        ftp.retrlines("MLSD", collect)
+        return sizes
+
+    def _list_with_sizes(self, ftp: FTP, known_sizes: Dict[str, int] = None) -> Dict[str, int]:
+        """List the remote files that match the given pattern together with their sizes. A single `MLSD` command is used to fetch all the sizes in one round-trip, and it falls back to `NLST` plus a `SIZE` command per matched file if the server doesn't support `MLSD`
+
+        Args:
+            ftp (FTP): A logged in FTP connection in the remote directory `cwd`
+            known_sizes (Dict[str, int], optional): Sizes that are taken as they are in the `NLST` fallback, no `SIZE` command will be sent for these files. Defaults to None
+
+        Returns:
+            Dict[str, int]: A dict maps the matched filenames to their remote sizes in bytes
+        """
+        known_sizes = known_sizes or dict()
+        try:
+            return self._mlsd_sizes(ftp)
+        except error_perm as e:
+            if not str(e).startswith("50"):  # 500/502 command not understood/implemented
+                raise
+        # the names are listed first, since no `SIZE` command can be sent during the `NLST` transfer
+        files = self._nlst_matched(ftp)
+        # `retrlines` switches the connection to ASCII mode, switch back for the byte sizes that match the local files
+        ftp.sendcmd("TYPE I")
+        return {file: known_sizes[file] if file in known_sizes else (ftp.size(file) or 0) for file in files}
+
+    def _files_to_download(
+        self, ftp: FTP, sync_mode: str, local_sizes: Dict[str, int]
+    ) -> Tuple[List[str], Dict[str, int]]:
+        """List the matched remote files that need to download in the given `sync_mode`, together with the remote sizes of all the matched files
+
+        Args:
+            ftp (FTP): A logged in FTP connection in the remote directory `cwd`
+            sync_mode (str): See `sync_mode` argument in function `run`
+            local_sizes (Dict[str, int]): Sizes of the local files, see function `_local_sizes`
+
+        Returns:
+            Tuple[List[str], Dict[str, int]]: The files to download and the remote sizes of all the matched files
+        """
+        if sync_mode == "no_override":
+            # the existing files will never be updated, so don't even ask for their remote sizes
+            known_sizes = local_sizes
+        elif sync_mode == "auto":
+            # the files downloaded recently and not modified locally are considered up to date
+            now = time.time()
+            known_sizes = {
+                file: size
+                for file, size in local_sizes.items()
+                if file in self._manifest
+                and self._manifest[file]["size"] == size
+                and now - self._manifest[file]["mtime"] < self.manifest_ttl
+            }
+        else:
+            known_sizes = dict()
+        sizes = self._list_with_sizes(ftp, known_sizes=known_sizes)
+
+        files = list()
+        for file, size in sizes.items():
+            if file in local_sizes:  # file exists
+                if sync_mode == "no_override":
+                    continue
+                if (sync_mode == "auto") and (local_sizes[file] == size):
+                    # the mode is 'auto' and the file size is equal, no need to update
+                    continue
+            files.append(file)
+        return files, sizes
+
+    @staticmethod
+    async def _worker(ftp: FTP, home: str, queue: asyncio.Queue) -> None:
+        """Download the files in `queue` one by one with the persistent connection `ftp` until the queue is empty, the queue items are tuples of `(downloader, file, remote size)`"""
+        cwd = None  # the remote directory `ftp` is currently in
+        try:
+            while True:
+                try:
+                    downloader, file, size = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if downloader.cwd != cwd:
+                    try:
+                        await asyncio.to_thread(_change_dir, ftp, home, downloader.cwd)
+                    except Exception as e:  # the connection is broken, e.g. left by a failed download
+                        logging.info("Failed to change to the remote directory %s\n %s", downloader.cwd, e)
+                        ftp = await asyncio.to_thread(downloader._reconnect, ftp)
+                ftp = await asyncio.to_thread(downloader._download, ftp, file, size)
+                cwd = downloader.cwd
+        finally:
+            # `ftp` may be a new connection opened by a re-login, the given one is closed by the caller as well
+            await asyncio.to_thread(ftp.close)
+
+    def _download(self, ftp: FTP, file: str, size: int = None) -> FTP:
+        """Download a single remote `file` with connection `ftp`, a failed download will be retried with a new connection, resuming from the partially downloaded data
+
+        Args:
+            ftp (FTP): A logged in FTP connection in the remote directory `cwd`
+            file (str): The remote file to download
+            size (int, optional): The remote size of the file, used to verify the downloaded file. Defaults to None
+
+        Returns:
+            FTP: The connection to use for the next file, a new one if `ftp` is broken
+        """
+        filepath = os.path.join(self.local_root, file)
+        filepath_cache = os.path.join(self.local_root, file + ".1")
+        logging.info("Downloading file %s to %s ...", file, filepath)
+        for attempt in range(1, _MAX_ATTEMPTS + 1):
+            start = timeit.default_timer()
+            try:
+                self._retrieve(ftp, file, filepath_cache)
+                downloaded_size = os.stat(filepath_cache).st_size
+                if size and downloaded_size != size:
+                    os.remove(filepath_cache)  # the resumed data doesn't fit, start over in the next attempt
+                    raise IOError(f"The size of the downloaded file is different from the remote size {size}")
+                os.replace(filepath_cache, filepath)  # atomic rename, the cache file is in the same directory
+                self._manifest[file] = {"size": downloaded_size, "mtime": time.time()}
+                self._manifest_updated.add(file)
+                stop = timeit.default_timer()
+                logging.info("Time used %.0fs for downloading file %s", stop - start, file)
+                break
+            except Exception as e:
+                stop = timeit.default_timer()
+                logging.info("Exception happens when download %s to %s (attempt %d)\n %s", file, filepath, attempt, e)
+                logging.info("Time used %.0fs for downloading file %s", stop - start, filepath_cache)
+                if attempt < _MAX_ATTEMPTS:  # re-login for the next attempt
+                    ftp = self._reconnect(ftp)
+        return ftp
+
+    def _reconnect(self, ftp: FTP) -> FTP:
+        """Close the (broken) connection `ftp` and open a new one in the remote directory `cwd`. A failed login is logged instead of raised and the closed `ftp` is returned, so that it is retried by the next attempt (or file) rather than stopping the downloads of the other files"""
+        ftp.close()
+        try:
+            return self._connect()
+        except Exception as e:
+            logging.info("Failed to re-login to %s\n %s", self.host, e)
+            return ftp
+
+    def _retrieve(self, ftp: FTP, file: str, filepath_cache: str) -> None:
+        """Retrieve the remote `file` into the local file `filepath_cache`. If `filepath_cache` already exists (left by a failed download), the download resumes from its end with a `REST` command, or restarts from the beginning if the server doesn't support it"""
+        try:
+            offset = os.stat(filepath_cache).st_size
+        except FileNotFoundError:
+            offset = 0
+        if offset:
+            try:
+                with open(filepath_cache, "ab", buffering=0) as fh:
+                    self._retrieve_to(ftp, file, fh, rest=offset)
+                return
+            except error_perm as e:
+                logging.info("Failed to resume %s from %d bytes, restart the download\n %s", file, offset, e)
+        with open(filepath_cache, "wb", buffering=0) as fh:
+            self._retrieve_to(ftp, file, fh)
+
+    def _retrieve_to(self, ftp: FTP, file: str, fh, rest: int = None) -> None:
+        """Retrieve the remote `file` from the offset `rest` into the opened local file `fh`"""
+        ftp.retr_to_fd("RETR " + file, fh.fileno(), blocksize=self.block_size, rest=rest)
+        if hasattr(os, "posix_fadvise"):
+            # the downloaded data won't be read soon, don't keep it in the page cache
+            os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def _change_dir(ftp: FTP, home: str, cwd: str) -> None:
+    """Change the remote directory of `ftp` to `cwd`, which is relative to the login directory `home`"""
+    ftp.cwd(home)
+    ftp.cwd(cwd)
+
+
+def read_sync_csv(csv_path: Union[str, os.PathLike]) -> List[Tuple[str, str, str, str, str, str]]:
+    """Read the CSV file that specifies the files to sync, see the CSV file specification in readme.md for details
+
+    Args:
+        csv_path (Union[str, os.PathLike]): CSV filepath
+
+    Returns:
+        List[Tuple[str, str, str, str, str, str]]: rows of `(host, user, passwd, cwd, local_root, file_reg)`, the blank cells are read as ""
+    """
+    columns = ("host", "user", "passwd", "cwd", "local_root", "file_reg")
+    with open(csv_path, newline="") as fh:
+        reader = csv.DictReader(fh)
+        reader.fieldnames = [name.strip() for name in reader.fieldnames or []]  # tolerate spaces in the header
+        return [tuple(row.get(column) or "" for column in columns) for row in reader]
 
 
 if __name__ == "__main__":
@@ -1,19 +1,19 @@
 # -*- coding: utf-8 -*-
 import logging
-import multiprocessing as mp
 import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from functools import partial
+from itertools import groupby
 from logging import handlers
+from operator import attrgetter
 from pathlib import Path
 from typing import List
 
-import pandas as pd
 import schedule
 import typer
-from ftp_downloader import FTPDownloader
+from ftp_downloader import FTPDownloader, read_sync_csv
 
 
 class SyncMode(str, Enum):
@@ -22,26 +22,9 @@ class SyncMode(str, Enum):
     no_override = "no_override"
 
 
-def sync(sync_info: pd.DataFrame, sync_mode: SyncMode, num_workers: int):
+def sync(downloaders: List[FTPDownloader], sync_mode: SyncMode, executor: ThreadPoolExecutor):
     logging.info("Scheduled sync start...")
 
-    downloaders: List[FTPDownloader] = list()
-    for item in sync_info.itertuples(index=False):
-        host, user, passwd, cwd, local_root, file_reg = item
-
-        # print(host, user, passwd, cwd, local_root, file_reg)
-
-        downloaders.append(
-            FTPDownloader(
-                host=host,
-                cwd=cwd,
-                local_root=local_root,
-                file_reg=file_reg,
-                user=str(user),
-                passwd=str(passwd),
-            )
-        )
-
     # for downloader in downloaders:
     #     try:
     #         downloader.run()
@@ -49,20 +32,47 @@ def sync(sync_info: pd.DataFrame, sync_mode: SyncMode, num_workers: int):
     #         break  # stop the download if the `ctrl+c` is pressed
     #     except:
     #         print(f"Something wrong!")
-    pool = mp.Pool(num_workers)
-    pools = [pool.apply_async(partial(downloader.run, sync_mode=sync_mode.value)) for downloader in downloaders]
-    pool.close()
-    for p in pools:
-        p.get()
+    # the downloaders login to the same server with the same account share their FTP connections
+    login_key = attrgetter("host", "user", "passwd", "tls")
+    groups = [list(group) for _, group in groupby(sorted(downloaders, key=login_key), key=login_key)]
+    futures = [executor.submit(FTPDownloader.run_many, group, sync_mode=sync_mode.value) for group in groups]
+    for future in futures:
+        future.result()
 
     logging.info("Scheduled sync complete.")
 
 
+def setup_logging(log_file: Path = None):
+    """Configure the root logger to output into the console and the rotating log file `log_file`. Nothing will be done if the root logger has already been configured, so that no handler (and opened log file) is registered twice
+
+    Args:
+        log_file (Path, optional): Output Log filepath. Defaults to None, which means only output into the console
+    """
+    if logging.getLogger().hasHandlers():
+        return
+    handler_list = list()
+    stream_handler = logging.StreamHandler()
+    handler_list.append(stream_handler)
+    if log_file is not None:
+        log_dir = os.path.dirname(log_file)
+        if log_dir != "":
+            os.makedirs(log_dir, exist_ok=True)
+        file_handler = handlers.RotatingFileHandler(filename=log_file, maxBytes=204800, backupCount=5)
+        handler_list.append(file_handler)
+    logging.basicConfig(
+        handlers=handler_list,
+        format="%(asctime)s %(message)s",
+        level=logging.INFO,
+    )
+
+
 def main(
     csv: Path = typer.Argument(..., help="CSV filepath"),
     log_file: Path = typer.Option("logs/download_log.log", help="Output Log filepath"),
     sync_mode: SyncMode = typer.Option(SyncMode.no_override, help="can be auto, override or no_override"),
     num_workers: int = typer.Option(1, help="Number of workders"),
+    parallel_per_host: int = typer.Option(4, help="Number of files downloaded in parallel per FTP server"),
+    once: bool = typer.Option(False, help="Sync once and exit, instead of syncing again at 00:00 every day"),
 ):
     """Start the downloader with given CSV file and other options
 
@@ -74,23 +84,12 @@ def main(
         python main_download_sync.py ncep_cpc.csv sync_mode=auto\n
             will download and automatically determine whether to override the existing local files based on the file size difference between local and remote\n\n
         python main_download_sync.py default.csv --num-workders 4 --log-file logs/example.log\n
-            will download files specified in ncep_cpc.csv with 4 workers (in parallel), and the logs will be output into the default log file logs/example.log
+            will download files specified in ncep_cpc.csv with 4 workers (in parallel), and the logs will be output into the default log file logs/example.log\n\n
+        python main_download_sync.py ncep_cpc.csv --once\n
+            will download files specified in ncep_cpc.csv and exit, which is suitable to be run by cron or a systemd timer
     """
     # ANCHOR Configuration for logger
-    handler_list = list()
-    stream_handler = logging.StreamHandler()
-    handler_list.append(stream_handler)
-    if log_file is not None:
-        log_dir = os.path.dirname(log_file)
-        if log_dir != "":
-            os.makedirs(log_dir, exist_ok=True)
-        file_handler = handlers.RotatingFileHandler(filename=log_file, maxBytes=204800, backupCount=5)
-        handler_list.append(file_handler)
-    logging.basicConfig(
-        handlers=handler_list,
-        format="%(asctime)s %(message)s",
-        level=logging.INFO,
-    )
+    setup_logging(log_file)
 
     # ANCHOR handle command line arguments
     assert os.path.exists(csv), f"CSV file {csv} doesn't exist."
@@ -98,31 +97,65 @@ def main(
     logging.info(f"Sync files specified in {csv}")
 
     # ANCHOR load informations and set schedule
-    sync_info_df = pd.read_csv(csv)
-    sync_info_df.fillna("", inplace=True)
-    # logging.info(f"File information: \n {sync_info_df}")
-    schedule.every().day.at("00:00").do(sync, sync_info=sync_info_df, sync_mode=sync_mode, num_workers=num_workers)
+    sync_info = read_sync_csv(csv)
+    # the downloaders are built once and reused by all the scheduled syncs
+    downloaders = [
+        FTPDownloader(
+            host=host,
+            cwd=cwd,
+            local_root=local_root,
+            file_reg=file_reg,
+            user=user,
+            passwd=passwd,
+            parallel_per_host=parallel_per_host,
+        )
+        for host, user, passwd, cwd, local_root, file_reg in sync_info
+    ]
+    # the workers are shared by all the scheduled syncs, threads are enough since the downloads are I/O-bound
+    executor = ThreadPoolExecutor(max_workers=num_workers)
+    # logging.info(f"File information: \n {sync_info}")
+    if not once:
+        schedule.every().day.at("00:00").do(
+            sync,
+            downloaders=downloaders,
+            sync_mode=sync_mode,
+            executor=executor,
+        )
     # schedule.every().minute.do(sync,
-    #                            sync_info=sync_info_df,
+    #                            downloaders=downloaders,
     #                            num_workers=num_workers)  # FOR DEBUG
     try:
         logging.info(f"Performing the first synchronization after startup...")
-        sync(sync_info=sync_info_df, sync_mode=sync_mode, num_workers=num_workers)
+        sync(
+            downloaders=downloaders,
+            sync_mode=sync_mode,
+            executor=executor,
+        )
     except KeyboardInterrupt:
         logging.exception("ctrl-c is pressed.")
+        executor.shutdown(wait=False, cancel_futures=True)
         sys.exit()  # stop the program if the `ctrl+c` is pressed
     except:
         logging.exception("Something wrong during first synchronization!")
+        if once:
+            sys.exit(1)
 
     while True:
         try:
+            # sleep exactly until the next scheduled job
+            idle_seconds = schedule.idle_seconds()
+            if idle_seconds is None:  # no job scheduled
+                break
+            if idle_seconds > 0:
+                time.sleep(idle_seconds)
             schedule.run_pending()
-            time.sleep(3600)
         except KeyboardInterrupt:
             logging.exception("ctrl-c is pressed.")
+            executor.shutdown(wait=False, cancel_futures=True)
             sys.exit()  # stop the program if the `ctrl+c` is pressed
         except:
             logging.exception("Something wrong!")
+    executor.shutdown()
 
 
 if __name__ == "__main__":
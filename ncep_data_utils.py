@@ -9,6 +9,8 @@ Function lists:
 - `read_quarterly_ncep`: read monthly NCEP reanalysis I&II data, as well as the reconstructed 2.5deg sst data
 - `read_rolled_ncep`: read rolled mean NCEP reanalysis I&II data, as well as the reconstructed 2.5deg sst data
 - `read_highres_daily_sst`: read high-resolution daily sst data. Note the data is available from 1981-09-01
+- `materialize_zarr`: write the daily NCEP reanalysis I&II data of a region into a local zarr store chunked for regional reads
+- `read_daily_ncep_zarr`: read daily NCEP reanalysis I&II data from a zarr store written by `materialize_zarr`
 
 - `read_daily_cpc`: read daily tmax/tmin/precip data from CPC global data
 - `read_monthly_cpc`: read monthly tmax/tmin/precip data from CPC global data
@@ -17,16 +19,22 @@ Function lists:
 - `month_select`: select data from `original_data` in dates of given `months`
 - `year_select`: select data from `original_data` in dates of given `years`
 - `spatial_cropping`: crop data from `original_data` within given latitude/longitude range
+- `clear_cache`: release the yearly data files cached by the reading functions
 
 Notes:
 - `slp` variable in NCEP Reanalysis I is named `mslp` in NCEP Reanalysis II
 """
 import calendar
 import os
+import threading
 import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
-from typing import Dict, List, Literal, Tuple, Union
+from functools import partial
+from typing import Callable, Dict, List, Literal, Tuple, Union
 
+import numpy as np
 import xarray as xr
 from dateutil.relativedelta import relativedelta
 from omegaconf import OmegaConf
@@ -41,6 +49,162 @@ _HIGHRES_SST_FILEPATH_FMT = cfg["_HIGHRES_SST_FILEPATH_FMT"]
 _RECON2dot5_SST_FILEPATH_FMT = cfg["_RECON2dot5_SST_FILEPATH_FMT"]
 
 
+# the yearly datasets opened by `_open_year`, from (filepath, chunks) to (modification time, dataset), least recently
+# used first
+_OPENED_YEARS = OrderedDict()
+_OPENED_YEARS_SIZE = 128
+_OPENED_YEARS_LOCK = threading.Lock()
+
+
+def _open_year(nc_file: str, chunks: Tuple[Tuple[str, int], ...] = None) -> xr.Dataset:
+    """Open the yearly NetCDF file `nc_file` lazily. The opened dataset is cached by the filepath (which identifies the factor, year and data source), its modification time and the chunks, so that the reads of overlapping years reuse the parsed file instead of opening it again, while a file rewritten (e.g. by the downloader) is opened again. The stale and the least recently used datasets beyond 128 are closed. The cached dataset must not be modified or closed
+
+    Args:
+        nc_file (str): Filepath of the yearly data
+        chunks (Tuple[Tuple[str, int], ...], optional): Dask chunk sizes as (dimension, size) pairs. Defaults to None, which means no dask.
+
+    Returns:
+        xr.Dataset: The opened dataset
+    """
+    key, mtime = (nc_file, chunks), os.stat(nc_file).st_mtime_ns
+    with _OPENED_YEARS_LOCK:
+        cached = _OPENED_YEARS.get(key)
+        if cached is not None and cached[0] == mtime:
+            _OPENED_YEARS.move_to_end(key)
+            return cached[1]
+    ds = xr.open_dataset(nc_file, chunks=None if chunks is None else dict(chunks))
+    closing = list()
+    with _OPENED_YEARS_LOCK:
+        if key in _OPENED_YEARS:  # stale, or opened by another thread meanwhile
+            closing.append(_OPENED_YEARS.pop(key)[1])
+        _OPENED_YEARS[key] = (mtime, ds)
+        while len(_OPENED_YEARS) > _OPENED_YEARS_SIZE:
+            closing.append(_OPENED_YEARS.popitem(last=False)[1][1])
+    # the lazy data read from a closed dataset is still readable, the file is reopened on access
+    for stale_ds in closing:
+        stale_ds.close()
+    return ds
+
+
+def clear_cache():
+    """Close the yearly files cached by the readers. The files rewritten on disk are reopened by the readers anyway, this only releases the file handles"""
+    with _OPENED_YEARS_LOCK:
+        closing = [ds for _, ds in _OPENED_YEARS.values()]
+        _OPENED_YEARS.clear()
+    for ds in closing:
+        ds.close()
+
+
+def _open_yearly_files(
+    nc_files: List[str], preprocess: Callable = None, lazy: bool = True, chunks: Dict[str, int] = None
+) -> xr.Dataset:
+    """Open the yearly NetCDF files `nc_files` in parallel threads and concatenate them along the `time` dimension in the given order. The GIL is released by netCDF/HDF5 during the reads, and the opened files are cached by `_open_year`
+
+    Args:
+        nc_files (List[str]): Filepaths of the yearly data, in chronological order
+        preprocess (Callable, optional): Function applied to the dataset of each year before concatenation, such as the subset selection. Defaults to None.
+        lazy (bool, optional): Whether to open the files lazily with dask. If False, the data of each year is read into memory in the threads. Defaults to True.
+        chunks (Dict[str, int], optional): Dask chunk sizes if `lazy`. They are applied when opening the files (instead of rechunking afterwards) so they decide how much is read per access, thus should be multiples of the chunks on disk. Defaults to None, which means {"time": 366, "lat": -1, "lon": -1}, exactly one chunk per yearly file (leap years included), so that the chunks align with the month and quarter boundaries of `resample`.
+
+    Returns:
+        xr.Dataset: The dataset of all the years, chunked by `chunks` if `lazy`
+    """
+    if not nc_files:
+        raise ValueError("No yearly data file to read, check the date range")
+    ds_time = _open_files(nc_files, [preprocess] * len(nc_files), lazy=lazy, chunks=chunks)
+    # the yearly files share the same grid, so only the variables with a `time` dimension are concatenated and
+    # the others are taken from the first file without comparing them
+    return xr.concat(ds_time, dim="time", join="inner", data_vars="minimal", coords="minimal", compat="override")
+
+
+def _open_files(
+    nc_files: List[str], preprocesses: List[Callable], lazy: bool = True, chunks: Dict[str, int] = None
+) -> List[xr.Dataset]:
+    """Open the NetCDF files `nc_files` in parallel threads, each of which is preprocessed by the function of the same position in `preprocesses`. See `_open_yearly_files` for the arguments
+
+    Returns:
+        List[xr.Dataset]: The opened datasets in the same order as `nc_files`
+    """
+    if chunks is None:
+        chunks = {"time": 366, "lat": -1, "lon": -1}
+    chunks_key = tuple(chunks.items()) if lazy else None
+
+    def open_file(nc_file: str, preprocess: Callable) -> xr.Dataset:
+        ds = _open_year(nc_file, chunks_key)
+        if preprocess is not None:
+            ds = preprocess(ds)
+        # load a shallow copy, the cached dataset itself stays lazy
+        return ds if lazy else ds.copy(deep=False).load()
+
+    if not nc_files:  # no thread pool of 0 workers
+        return []
+    with ThreadPoolExecutor(max_workers=min(8, len(nc_files))) as executor:
+        return list(executor.map(open_file, nc_files, preprocesses))
+
+
+def _select_factor(ds: xr.Dataset, factor: str, levels: list = None, **subset_kwargs) -> xr.Dataset:
+    """Keep only the variable `factor` of `ds` and select the subset by `_subset` with `subset_kwargs`, and then split the variable into the sub-variables of given `levels`, named like `air500`. It is applied to each yearly file of the factor, so that the other variables and levels are never concatenated
+
+    Args:
+        ds (xr.Dataset): The opened dataset
+        factor (str): Name of the variable
+        levels (list, optional): Levels of the variable. Defaults to None, which means the variable doesn't have a level.
+
+    Returns:
+        xr.Dataset: The dataset of the (sub-)variables of the factor
+    """
+    # the variable is subset and split as a DataArray, the only Dataset is built once from the dict of sub-variables
+    da = _subset(ds[factor], **subset_kwargs)
+    if levels is None:
+        return xr.Dataset({factor: da})
+    # drop=True丢掉只有长度只有1的level维度
+    return xr.Dataset({f"{factor}{level}": da.sel(level=level, drop=True) for level in levels})
+
+
+def _subset(
+    ds: Union[xr.Dataset, xr.DataArray],
+    start_date: date,
+    end_date: date,
+    lat_range: Tuple[float, float] = None,
+    lon_range: Tuple[float, float] = None,
+) -> Union[xr.Dataset, xr.DataArray]:
+    """Select the data of `ds` within the date range [`start_date`, `end_date`] and the given latitude/longitude range. It is applied to each yearly file right after opening it, so that only the needed chunks are read
+
+    Args:
+        ds (Union[xr.Dataset, xr.DataArray]): The opened data
+        start_date (date): Start date of the data to select
+        end_date (date): End date of the data to select
+        lat_range (Tuple[float, float], optional): Latitude range. Defaults to None, which means no cropping in latitude.
+        lon_range (Tuple[float, float], optional): Longitude range. Defaults to None, which means no cropping in longitude.
+
+    Returns:
+        Union[xr.Dataset, xr.DataArray]: The subset of `ds`
+    """
+    ds = ds.sel(time=slice(start_date, end_date))
+    if lat_range is not None or lon_range is not None:
+        ds = spatial_cropping(ds, lat_range, lon_range)
+    return ds
+
+
+def _rolling_mean(ds: xr.Dataset, num_days: int, center: bool) -> xr.Dataset:
+    """The `num_days` moving mean of `ds` along time, without the incomplete windows at the ends of the time range. The incomplete windows are dropped by position, so that the result stays lazy
+
+    Args:
+        ds (xr.Dataset): The daily data
+        num_days (int): the roll window size (number of days)
+        center (bool): Set the labels at the center of the window
+
+    Returns:
+        xr.Dataset: The rolled mean data
+    """
+    # the moving mean runs on each dask chunk (with overlaps) in O(n) instead of averaging every constructed window
+    rolled_ds = ds.rolling(dim={"time": num_days}, center=center).mean()
+    # the incomplete windows are the first `num_days - 1` steps, or split between both ends when centered
+    head = num_days // 2 if center else num_days - 1
+    tail = num_days - 1 - head
+    return rolled_ds.isel(time=slice(head, rolled_ds.sizes["time"] - tail))
+
+
 # ANCHOR read_daily_cpc
 def read_daily_ncep(
     factors: Dict[str, list],
@@ -49,6 +213,8 @@ def read_daily_ncep(
     lat_range: Tuple[float, float] = None,
     lon_range: Tuple[float, float] = None,
     source: Literal["NCEP_REANALYSIS", "NCEP_REANALYSIS_II"] = "NCEP_REANALYSIS",
+    lazy: bool = True,
+    chunks: Dict[str, int] = None,
 ) -> xr.Dataset:
     """
     Function for reading daily NCEP Reanalysis I&II data
@@ -60,51 +226,105 @@ def read_daily_ncep(
         lat_range (Tuple[float, float], optional): Latitude range of the data to read, which should be a subinterval of [-90, 90]. Defaults to None, which means the range is the whole [-90, 90].
         lon_range (Tuple[float, float], optional): Longitude range of the data to read, which should be a subinterval of [0, 360]. Defaults to None, which means the range is the whole [0, 360].
         source (Literal[, optional): Specify the data source. "NCEP_REANALYSIS" for NCEP Reanalysis I dataset, and "NCEP_REANALYSIS_II" for NCEP Reanalysis II dataset. Defaults to "NCEP_REANALYSIS".
+        lazy (bool, optional): Whether to return the dask-backed data which is loaded lazily. If False, the yearly files are read into memory in parallel threads. Defaults to True.
+        chunks (Dict[str, int], optional): Dask chunk sizes of the lazy data, see `_open_yearly_files`. Defaults to None.
 
     Returns:
         xr.Dataset: `daily_ds` The daily NCEP reanalysis I (or II) data of given variables & temporal & spatial range
     """
-    year_start, year_end = start_date.year, end_date.year
-    ds_factor = list()
-    for factor in factors.keys():
-        ds_time = list()
-        for year in range(year_start, year_end + 1):
+    years = range(start_date.year, end_date.year + 1)
+    subset_kwargs = dict(start_date=start_date, end_date=end_date, lat_range=lat_range, lon_range=lon_range)
+    # (要素 x 年份)的所有文件, 每个文件打开后先筛选时间和经纬度范围, 再拆分成各层次的子物理量, 只读取需要的数据块
+    nc_files, preprocesses = list(), list()
+    for factor, levels in factors.items():
+        preprocess = partial(_select_factor, factor=factor, levels=levels, **subset_kwargs)
+        for year in years:
             if factor == "sst":
-                nc_file = _RECON2dot5_SST_FILEPATH_FMT.format(year=year)
+                nc_files.append(_RECON2dot5_SST_FILEPATH_FMT.format(year=year))
             else:
-                nc_file = os.path.join(_NCEP_ROOT[source], _NCEP_FACTOR_FILENAMES[factor].format(year=year))
-            with xr.open_dataset(nc_file) as daily_ds:
-                da = daily_ds[factor]
-                levels = factors[factor]
-                ds_level = list()  # list of dataset
-                if levels is not None:
-                    for level in levels:
-                        # new sub-veriable name
-                        var_name = f"{factor}{level}"
-                        ds_level.append(
-                            xr.Dataset({var_name: da.sel(level=level, drop=True)})
-                        )  # drop=True丢掉只有长度只有1的level维度
-                else:
-                    ds_level.append(xr.Dataset({factor: da}))
-
-                ds_time.append(xr.merge(ds_level))  # 将单个要素的分层子物理量组合起来, 放在时间列表中
-        ds_factor.append(xr.concat(ds_time, dim="time", join="inner"))  # 将时间列表中所有的要素在时间维度上进行合并
-
-    daily_ds = xr.merge(ds_factor)  # 将将所有要素的(子)物理量全部合并到一个xr.Dataset中
-    # 筛选指定日期范围内的数据
-    daily_ds = daily_ds.sel(time=slice(start_date, end_date))
-    # 筛选指定经纬度范围内的数据
-    if lat_range is not None:
-        lat = daily_ds.lat
-        lat_select = lat[(lat >= lat_range[0]) & (lat <= lat_range[1])]
-        daily_ds = daily_ds.sel(lat=lat_select)
-    if lon_range is not None:
-        lon = daily_ds.lon
-        lon_select = lon[(lon >= lon_range[0]) & (lon <= lon_range[1])]
-        daily_ds = daily_ds.sel(lon=lon_select)
+                nc_files.append(os.path.join(_NCEP_ROOT[source], _NCEP_FACTOR_FILENAMES[factor].format(year=year)))
+            preprocesses.append(preprocess)
+    if not nc_files:
+        raise ValueError(f"No data file to read for the factors {list(factors)} from {start_date} to {end_date}")
+    # 所有文件在多个线程中同时打开(读取)
+    ds_list = _open_files(nc_files, preprocesses, lazy=lazy, chunks=chunks)
+    ds_grid = [ds_list[i : i + len(years)] for i in range(0, len(ds_list), len(years))]
+    # 一次性将(要素 x 年份)的网格在时间维度上合并, 在要素维度上融合到一个xr.Dataset中
+    daily_ds = xr.combine_nested(
+        ds_grid,
+        concat_dim=[None, "time"],
+        data_vars="minimal",
+        coords="minimal",
+        compat="override",
+        join="outer",
+    )
     return daily_ds
 
 
+# ANCHOR materialize_zarr
+def materialize_zarr(
+    factors: Dict[str, list],
+    start_date: date,
+    end_date: date,
+    zarr_path: str,
+    lat_range: Tuple[float, float] = None,
+    lon_range: Tuple[float, float] = None,
+    source: Literal["NCEP_REANALYSIS", "NCEP_REANALYSIS_II"] = "NCEP_REANALYSIS",
+    chunks: Dict[str, int] = None,
+):
+    """Read the daily NCEP Reanalysis I&II data once and write it into a local zarr store `zarr_path`, which is chunked for the frequent reads of small regions, while the NetCDF files are chunked for whole-globe reads. Read it back with `read_daily_ncep_zarr`
+
+    Args:
+        factors (Dict[str, list]): same as in `read_daily_ncep`
+        start_date (date): same as in `read_daily_ncep`
+        end_date (date): same as in `read_daily_ncep`
+        zarr_path (str): Path of the zarr store to write, the existing store will be overwritten
+        lat_range (Tuple[float, float], optional): same as in `read_daily_ncep`
+        lon_range (Tuple[float, float], optional): same as in `read_daily_ncep`
+        source (Literal[, optional): same as in `read_daily_ncep`
+        chunks (Dict[str, int], optional): Chunk sizes of the zarr store. Defaults to None, which means {"time": 30, "lat": 50, "lon": 50}.
+    """
+    if chunks is None:
+        chunks = {"time": 30, "lat": 50, "lon": 50}
+    daily_ds = read_daily_ncep(
+        factors=factors,
+        start_date=start_date,
+        end_date=end_date,
+        lat_range=lat_range,
+        lon_range=lon_range,
+        source=source,
+    )
+    daily_ds = daily_ds.chunk(chunks)
+    # the chunks of the source files are kept in the encodings, which would conflict with the new chunks
+    for var in daily_ds.variables.values():
+        var.encoding.pop("chunks", None)
+    daily_ds.to_zarr(zarr_path, mode="w")
+
+
+# ANCHOR read_daily_ncep_zarr
+def read_daily_ncep_zarr(
+    zarr_path: str,
+    start_date: date = None,
+    end_date: date = None,
+    lat_range: Tuple[float, float] = None,
+    lon_range: Tuple[float, float] = None,
+) -> xr.Dataset:
+    """Read the daily NCEP Reanalysis I&II data from the zarr store written by `materialize_zarr`, the data is loaded lazily in the chunks of the store
+
+    Args:
+        zarr_path (str): Path of the zarr store
+        start_date (date, optional): Start date of the data to read. Defaults to None, which means from the beginning of the store.
+        end_date (date, optional): End date of the data to read. Defaults to None, which means to the end of the store.
+        lat_range (Tuple[float, float], optional): same as in `read_daily_ncep`
+        lon_range (Tuple[float, float], optional): same as in `read_daily_ncep`
+
+    Returns:
+        xr.Dataset: `daily_ds` The daily NCEP reanalysis I (or II) data of given temporal & spatial range
+    """
+    daily_ds = xr.open_zarr(zarr_path, chunks={})
+    return _subset(daily_ds, start_date, end_date, lat_range, lon_range)
+
+
 # ANCHOR read_monthly_cpc
 def read_monthly_ncep(
     factors: Dict[str, list],
@@ -220,16 +440,7 @@ def read_rolled_ncep(
         lon_range=lon_range,
         source=source,
     )
-    rolled_ds = (
-        ds.rolling(
-            dim={"time": num_days},
-            center=center,
-        )
-        .mean()
-        .dropna(dim="time", how="all")
-    )
-    # rolled_ds = (ds.rolling(time=num_days).mean().shift(
-    #     time=-(num_days - 1)).dropna(dim="time", how="all"))
+    rolled_ds = _rolling_mean(ds, num_days, center)
     return rolled_ds
 
 
@@ -240,6 +451,8 @@ def read_daily_cpc(
     end_date: date,
     lat_range: Tuple[float, float] = None,
     lon_range: Tuple[float, float] = None,
+    lazy: bool = True,
+    chunks: Dict[str, int] = None,
 ) -> xr.Dataset:
     """
     Function for reading daily CPC total precipitation / maximum temperature / minimum temperature data
@@ -250,30 +463,19 @@ def read_daily_cpc(
         end_date (date): End date of the data to read
         lat_range (Tuple[float, float], optional): Latitude range of the data to read, which should be a subinterval of [-90, 90]. Defaults to None, which means the range is the whole [-90, 90]
         lon_range (Tuple[float, float], optional): Longitude range of the data to read, which should be a subinterval of [0, 360]. Defaults to None, which means the range is the whole [0, 360].
+        lazy (bool, optional): Whether to return the dask-backed data which is loaded lazily. If False, the yearly files are read into memory in parallel threads. Defaults to True.
+        chunks (Dict[str, int], optional): Dask chunk sizes of the lazy data, see `_open_yearly_files`. Defaults to None.
 
     Returns:
         xr.Dataset: `daily_ds` The daily CPC data of given variable
     """
     year_start, year_end = start_date.year, end_date.year
-    ds_time = list()
-    for year in range(year_start, year_end + 1):
-        nc_file = os.path.join(_CPC_FACTOR_FILENAMES[factor].format(year=year))
-        with xr.open_dataset(nc_file) as ds:
-            ds_time.append(ds)
-    # concat all datasets of years into a whole
-    daily_ds = xr.concat(ds_time, dim="time", join="inner")
-
-    # date slice
-    daily_ds = daily_ds.sel(time=slice(start_date, end_date))
-    # latitude & longitude crops
-    if lat_range is not None:
-        lat = daily_ds.lat
-        lat_select = lat[(lat >= lat_range[0]) & (lat <= lat_range[1])]
-        daily_ds = daily_ds.sel(lat=lat_select)
-    if lon_range is not None:
-        lon = daily_ds.lon
-        lon_select = lon[(lon >= lon_range[0]) & (lon <= lon_range[1])]
-        daily_ds = daily_ds.sel(lon=lon_select)
+    nc_files = [
+        os.path.join(_CPC_FACTOR_FILENAMES[factor].format(year=year)) for year in range(year_start, year_end + 1)
+    ]
+    # open all datasets of years as a whole, with date slice & latitude & longitude crops of each year
+    subset = partial(_subset, start_date=start_date, end_date=end_date, lat_range=lat_range, lon_range=lon_range)
+    daily_ds = _open_yearly_files(nc_files, preprocess=subset, lazy=lazy, chunks=chunks)
     return daily_ds
 
 
@@ -344,16 +546,7 @@ def read_rolled_cpc(
         lat_range=lat_range,
         lon_range=lon_range,
     )
-    # rolled_ds = (ds.rolling(time=num_days).mean().shift(
-    # time=-(num_days - 1)).dropna(dim="time", how="all"))
-    rolled_ds = (
-        ds.rolling(
-            dim={"time": num_days},
-            center=center,
-        )
-        .mean()
-        .dropna(dim="time", how="all")
-    )
+    rolled_ds = _rolling_mean(ds, num_days, center)
     return rolled_ds
 
 
@@ -368,9 +561,9 @@ def month_select(original_data: Union[xr.Dataset, xr.DataArray], months: List[in
     Returns:
         Union[xr.Dataset, xr.DataArray]: `subset_data` - The subset of the original data in dates of given `months`
     """
-    time_index = original_data.time
-    time_index = time_index[[dt.dt.month in months for dt in time_index]]
-    subset_data = original_data.sel(time=time_index)
+    # the months from the time index (pandas DatetimeIndex or CFTimeIndex) directly, without wrapping a DataArray
+    selected = np.isin(np.asarray(original_data.indexes["time"].month), np.asarray(months))
+    subset_data = original_data.isel(time=selected)
     return subset_data
 
 
@@ -385,9 +578,9 @@ def year_select(original_data: Union[xr.Dataset, xr.DataArray], years: List[int]
     Returns:
         Union[xr.Dataset, xr.DataArray]: `subset_data` - The subset of the original data in dates of given `years`
     """
-    time_index = original_data.time
-    time_index = time_index[[dt.dt.year in years for dt in time_index]]
-    subset_data = original_data.sel(time=time_index)
+    # the years from the time index (pandas DatetimeIndex or CFTimeIndex) directly, without wrapping a DataArray
+    selected = np.isin(np.asarray(original_data.indexes["time"].year), np.asarray(years))
+    subset_data = original_data.isel(time=selected)
     return subset_data
 
 
@@ -416,7 +609,7 @@ def spatial_cropping(
         lon_range is not None
     ), "At least one of 'lat_range' and 'lon_range' arguments must be provided"
 
-    # Crop data with given spatial region
+    # Crop data with given spatial region, the slices are contiguous reads instead of the per-label (fancy) indexing
     if lat_range:
         lat = original_data.lat
         # lat_min, lat_max = lat.min().item(), lat.max().item(0)
@@ -424,8 +617,7 @@ def spatial_cropping(
         #     warnings.warn(
         #         f"The given latitude range {lat_range} is out of the range ({lat_min}, {lat_max}) of input data"
         #     )
-        lat_select = lat[(lat >= lat_range[0]) & (lat <= lat_range[1])]
-        original_data = original_data.sel(lat=lat_select)
+        original_data = original_data.isel(lat=_index_slice(lat, lat_range))
     if lon_range:
         lon = original_data.lon
         # lon_min, lon_max = lon.min().item(), lon.max().item()
@@ -433,11 +625,37 @@ def spatial_cropping(
         #     warnings.warn(
         #         f"The given longitude range {lon_range} is out of the range ({lon_min}, {lon_max}) of input data"
         #     )
-        lon_select = lon[(lon >= lon_range[0]) & (lon <= lon_range[1])]
-        original_data = original_data.sel(lon=lon_select)
+        lon_lower, lon_upper = sorted(lon_range)
+        if lon_upper - lon_lower >= 360:  # the whole globe, whatever the convention of the data
+            return original_data
+        # range in [-180, 180] while the data (like CPC) in [0, 360], the minimum of the monotonic axis is at one end
+        if lon_lower < 0 and min(lon.values[0], lon.values[-1]) >= 0:
+            lon_lower, lon_upper = lon_lower % 360, lon_upper % 360
+        if lon_lower > lon_upper:  # the range crosses the prime meridian
+            original_data = xr.concat(
+                [
+                    original_data.isel(lon=_index_slice(lon, (lon_lower, 360))),
+                    original_data.isel(lon=_index_slice(lon, (0, lon_upper))),
+                ],
+                dim="lon",
+            )
+        else:
+            original_data = original_data.isel(lon=_index_slice(lon, (lon_lower, lon_upper)))
     return original_data
 
 
+def _index_slice(coord: xr.DataArray, value_range: Tuple[float, float]) -> slice:
+    """Return the index slice of the monotonic (ascending or descending) coordinate `coord` within `value_range`, found by binary search"""
+    lower, upper = sorted(value_range)
+    values = coord.values
+    n = len(values)
+    if n > 1 and values[0] > values[-1]:  # descending like the NCEP latitudes 90 ~ -90
+        values = values[::-1]
+        start, stop = np.searchsorted(values, lower, side="left"), np.searchsorted(values, upper, side="right")
+        return slice(n - stop, n - start)
+    return slice(np.searchsorted(values, lower, side="left"), np.searchsorted(values, upper, side="right"))
+
+
 # ANCHOR read_highres_daily_sst
 def read_highres_daily_sst(
     start_date: date,
@@ -445,18 +663,12 @@ def read_highres_daily_sst(
     lat_range: Tuple[float, float] = None,
     lon_range: Tuple[float, float] = None,
 ):
-    da_list = list()  # DataArray of years
     start_year, end_year = start_date.year, end_date.year
-    for year in range(start_year, end_year + 1):
-        filepath = _HIGHRES_SST_FILEPATH_FMT.format(year=year)
-        da = xr.open_dataarray(filepath)
-        da_list.append(da)
-    # concat
-    daily_da = xr.concat(da_list, dim="time")
-    daily_da = daily_da.sortby("time")
-    # spatial cropping
-    if lat_range is not None and lon_range is not None:
-        daily_da = spatial_cropping(daily_da, lat_range, lon_range)
+    filepaths = [_HIGHRES_SST_FILEPATH_FMT.format(year=year) for year in range(start_year, end_year + 1)]
+    # date slice & spatial cropping of each year before concat, the 0.25deg data is chunked monthly to keep chunks small
+    subset = partial(_subset, start_date=start_date, end_date=end_date, lat_range=lat_range, lon_range=lon_range)
+    daily_ds = _open_yearly_files(filepaths, preprocess=subset, chunks={"time": 31, "lat": -1, "lon": -1})
+    daily_da = daily_ds["sst"].sortby("time")
     return daily_da
 
 
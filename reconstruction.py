@@ -9,18 +9,31 @@ import xarray as xr
 from ncep_data_utils import read_highres_daily_sst
 
 
+def _nearest_indices(coords: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """Find the indices of the nearest points in the monotonic coordinates `coords` of each of the `targets`, a tie goes to the smaller coordinate as the "nearest" interpolation of scipy does"""
+    if len(coords) > 1 and coords[0] > coords[-1]:
+        return len(coords) - 1 - _nearest_indices(coords[::-1], targets)
+    return np.searchsorted((coords[1:] + coords[:-1]) / 2, targets, side="left")
+
+
 def daily_sst_reconstruction(start_year: int, end_year: int, recon_filepath_fmt: str, resolution: float = 2.5):
+    lats = np.arange(-90, 90 + resolution / 2, resolution)
+    lons = np.arange(0, 360, resolution)
     for year in range(start_year, end_year + 1):
         print(f"Reconstruction of year {year}...")
         s_date = date(year, 1, 1)
         e_date = date(year, 12, 31)
-        # interpolation
-        lats = np.arange(-90, 90 + resolution / 2, resolution)
-        lons = np.arange(0, 360, resolution)
         daily_sst = read_highres_daily_sst(s_date, e_date)
-        daily_sst = daily_sst.interp(lat=lats, lon=lons, method="nearest")
+        # nearest interpolation on the regular grid, which is just gathering the nearest indices
+        lat_idx = _nearest_indices(daily_sst.lat.values, lats)
+        lon_idx = _nearest_indices(daily_sst.lon.values, lons)
+        daily_sst = daily_sst.isel(lat=lat_idx, lon=lon_idx).assign_coords(lat=lats, lon=lons)
         recon_filepath = recon_filepath_fmt.format(year=year)
-        daily_sst.to_netcdf(recon_filepath)
+        # compressed float32 (which is enough for sst) in monthly chunks of the whole grid, instead of the default
+        # uncompressed single chunk
+        chunksizes = tuple(min(30, size) if dim == "time" else size for dim, size in daily_sst.sizes.items())
+        encoding = {daily_sst.name: {"zlib": True, "complevel": 4, "chunksizes": chunksizes, "dtype": "float32"}}
+        daily_sst.to_netcdf(recon_filepath, encoding=encoding)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import numpy as np
+from visualization_utils import draw_contourf_grid, draw_contourf_map
+
+# no natural earth feature, so that nothing is downloaded
+_NO_FEATURES = {"COASTLINE": None, "BORDERS": None}
+
+
+class DrawContourfMapTest(unittest.TestCase):
+    def test_reuse_canvas(self):
+        lat, lon = np.arange(15, 55.1, 2.5), np.arange(70, 137.6, 2.5)
+        data = np.random.default_rng(0).random((len(lat), len(lon)))
+        figs, layouts = list(), list()
+        for i in range(3):
+            fig = draw_contourf_map(
+                lat, lon, data * (i + 1), title=f"map {i}", feature_kw=_NO_FEATURES, reuse_canvas=True
+            )
+            figs.append(fig)
+            layouts.append([tuple(ax.get_position().bounds) for ax in fig.axes])
+        # the same canvas is redrawn, with one map axes and one colorbar axes staying in place
+        self.assertTrue(all(fig is figs[0] for fig in figs))
+        self.assertEqual(len(figs[0].axes), 2)
+        self.assertEqual(layouts[0], layouts[1])
+        self.assertEqual(layouts[1], layouts[2])
+        self.assertEqual(figs[0].axes[0].get_title(), "map 2")
+
+
+class DrawContourfGridTest(unittest.TestCase):
+    def test_empty_stack(self):
+        lat, lon = np.arange(15, 55.1, 2.5), np.arange(70, 137.6, 2.5)
+        with self.assertRaises(ValueError):
+            draw_contourf_grid(lat, lon, np.empty((0, len(lat), len(lon))), feature_kw=_NO_FEATURES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,16 +1,160 @@
 # -*- coding: utf-8 -*-
 import math
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date
+from typing import List
 
 import cmaps
+import dask
 import numpy as np
 import pandas as pd
+from matplotlib.colors import BoundaryNorm, Normalize
 from ncep_data_utils import read_daily_cpc, read_monthly_cpc
-from visualization_utils import draw_contourf_map
+from visualization_utils import add_colorbar, draw_contourf_grid, make_map_canvas, update_contourf
+
+try:  # numba is optional, the anomaly is computed by numpy without it
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _nan_quantile(data: np.ndarray, q):
+    """Compute the quantiles `q` of `data` ignoring NaN. A cheap pre-check decides whether the NaNs need to be dropped, then np.quantile is used, which is much faster than np.nanquantile and DataArray.quantile"""
+    nan_mask = np.isnan(data)
+    if nan_mask.any():
+        data = data[~nan_mask]
+        if data.size == 0:
+            raise ValueError("All the values are NaN, no quantile can be computed")
+    return np.quantile(data, q)
+
+
+def _anomaly_kernel(data: np.ndarray, clim: np.ndarray):
+    """Subtract `clim` of shape (n_lat, n_lon) from each month of `data` of shape (n_months, n_lat, n_lon), and gather the non-NaN anomalies into a flat array in the same pass"""
+    n_months, n_lat, n_lon = data.shape
+    anomaly = np.empty(data.shape, dtype=np.float32)
+    values = np.empty(data.size, dtype=np.float32)
+    n_values = 0
+    for t in range(n_months):
+        for y in range(n_lat):
+            for x in range(n_lon):
+                v = data[t, y, x] - clim[y, x]
+                anomaly[t, y, x] = v
+                if not np.isnan(v):
+                    values[n_values] = v
+                    n_values += 1
+    return anomaly, values[:n_values]
+
+
+if njit is not None:
+    # NOTE no fastmath, which assumes there is no NaN and may drop the NaN check
+    _anomaly_kernel = njit(cache=True)(_anomaly_kernel)
+
+
+def anomaly_and_quantiles(data: np.ndarray, clim: np.ndarray, q: List[float]):
+    """Compute the anomaly `data - clim` and its quantiles `q` ignoring NaN. With numba, the subtraction and the gathering of the non-NaN values are fused into one compiled pass without the intermediate arrays
+
+    Args:
+        data (np.ndarray): Data of shape (n_months, n_lat, n_lon)
+        clim (np.ndarray): Climatology of shape (n_lat, n_lon)
+        q (List[float]): Quantiles to compute
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The anomaly of the same shape as `data` and the quantiles of shape (len(q), )
+    """
+    if njit is not None:
+        anomaly, values = _anomaly_kernel(data, clim)
+    else:
+        anomaly = data - clim[None, ...]
+        values = anomaly
+    # np.quantile selects the quantiles with np.partition in O(N)
+    return anomaly, _nan_quantile(values, q)
+
+
+def render_months(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    data: np.ndarray,
+    titles: List[str],
+    img_paths: List[str],
+    canvas_kw: dict,
+    contour_kw: dict,
+    norm: Normalize,
+    use_pcolormesh: bool = False,
+):
+    """Draw the maps of `data` of shape (n_months, n_lat, n_lon) on one map canvas and save them into `img_paths`. It is run in the worker processes by `render_months_parallel`, so it must stay a top-level function
+
+    Args:
+        lat (np.ndarray): Latitude of shape (n_lat, )
+        lon (np.ndarray): Longitude of shape (n_lon, )
+        data (np.ndarray): The monthly data of shape (n_months, n_lat, n_lon)
+        titles (List[str]): The titles of the months
+        img_paths (List[str]): The image paths of the months
+        canvas_kw (dict): Arguments of `make_map_canvas` except `lat` and `lon`
+        contour_kw (dict): Arguments of the contours, see `draw_contourf_map`. The fixed `levels` must be given, since one colorbar is shared by all the months
+        norm (Normalize): The normalization shared by the contours, see `draw_contourf_map`. It must be given for the same reason as the `levels`
+        use_pcolormesh (bool, optional): Whether to draw the meshes instead of the contours, see `draw_contourf_map`. Defaults to False
+    """
+    # the colorbar is built from the first month only, it fits the other months only if they share the levels and norm
+    assert np.iterable(contour_kw.get("levels")) and norm is not None, "The fixed `levels` and `norm` must be given."
+    fig, ax = make_map_canvas(lat, lon, **canvas_kw)
+    cf = None
+    for i, (title, img_path) in enumerate(zip(titles, img_paths)):
+        cf = update_contourf(
+            ax, lat, lon, data[i, ...], prev_cf=cf, contour_kw=contour_kw, norm=norm, use_pcolormesh=use_pcolormesh
+        )
+        if i == 0:
+            add_colorbar(fig, ax, cf)
+        ax.set_title(title)
+        # fast zlib level for the PNG, see `draw_contourf_map`
+        fig.savefig(img_path, bbox_inches="tight", pil_kwargs={"compress_level": 1})
+
+
+def render_months_parallel(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    data: np.ndarray,
+    titles: List[str],
+    img_paths: List[str],
+    canvas_kw: dict,
+    contour_kw: dict,
+    norm: Normalize,
+    use_pcolormesh: bool = False,
+    max_workers: int = None,
+):
+    """Draw the monthly maps in parallel processes, since contouring and rasterizing are CPU-bound and hold the GIL. The months are split into one contiguous batch per worker, and each worker reuses one map canvas for its batch. A single month (or worker) is drawn in the current process, since starting a worker (and importing cartopy in it) costs more than drawing one map
+
+    Args:
+        max_workers (int, optional): Number of worker processes. Defaults to None, which means the number of CPUs
+        Others are the same as in `render_months`
+    """
+    max_workers = min(max_workers or os.cpu_count(), len(titles))
+    if max_workers <= 1:
+        render_months(lat, lon, data, titles, img_paths, canvas_kw, contour_kw, norm, use_pcolormesh)
+        return
+    batches = np.array_split(np.arange(len(titles)), max_workers)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                render_months,
+                lat,
+                lon,
+                data[batch, ...],
+                [titles[i] for i in batch],
+                [img_paths[i] for i in batch],
+                canvas_kw,
+                contour_kw,
+                norm,
+                use_pcolormesh,
+            )
+            for batch in batches
+        ]
+        for future in futures:
+            future.result()
 
 
 def precip_diff_demo():
-    """This function demonstrates the plots of the month average precipitation difference (mm/day) with the annual mean precipitation. The region is set in (72E, 137E, 15N, 55N). The year 2020 is selected to compute the average. The month average precipitation differences (mm/day) between the average are computed in time period between 2020/08 to 2021/07 (12 months in total)., Then 12 figures, 1 for each month, will be plotted and saved into files.
+    """This function demonstrates the plots of the month average precipitation difference (mm/day) with the annual mean precipitation. The region is set in (72E, 137E, 15N, 55N). The year 2020 is selected to compute the average. The month average precipitation differences (mm/day) between the average are computed in time period between 2020/08 to 2021/07 (12 months in total)., Then the 12 months will be plotted as the 3x4 panels of one figure and saved into a file.
 
     Here are several tricks worth noting:
     1. Select an appropriate colorbar for the color mapping of the data, we use the 'BlueWhiteOrangeRed_r` colormap from package `cmaps`
@@ -19,40 +163,47 @@ def precip_diff_demo():
     """
     factor = "precip"
     xmin, xmax, ymin, ymax = 72, 137, 15, 55
-    cpc_clim_da = (
-        read_daily_cpc(factor, date(2020, 1, 1), date(2020, 12, 31), lat_range=(ymin, ymax), lon_range=(xmin, xmax))
-        .to_array()
-        .mean(dim="time", skipna=True)
-    )
+    # the data is read lazily, nothing is computed until the difference is computed below
+    cpc_clim_da = read_daily_cpc(
+        factor, date(2020, 1, 1), date(2020, 12, 31), lat_range=(ymin, ymax), lon_range=(xmin, xmax)
+    )[factor].mean(dim="time", skipna=True)
     cpc_da = read_monthly_cpc(
         factor, date(2020, 8, 1), date(2021, 7, 31), lat_range=(ymin, ymax), lon_range=(xmin, xmax)
-    ).to_array()
+    )[factor]
 
-    cpc_diff_da = cpc_da - cpc_clim_da
-    cpc_quantile_da = cpc_diff_da.quantile([0.02, 0.98], keep_attrs=False)
-    lat, lon = cpc_diff_da.lat.values, cpc_diff_da.lon.values
-    data = cpc_diff_da.values.squeeze()
-    vmax = round(max(abs(cpc_quantile_da[0].item()), abs(cpc_quantile_da[1].item())))
+    # the climatology and the monthly means share the reading of the files, computed together in one pass
+    cpc_clim_da, cpc_da = dask.compute(cpc_clim_da, cpc_da)
+    lat, lon = cpc_da.lat.values, cpc_da.lon.values
+    # the anomaly is computed on the raw arrays without the alignment of xarray, which needs the grids to be the same
+    assert np.array_equal(lat, cpc_clim_da.lat.values) and np.array_equal(lon, cpc_clim_da.lon.values)
+    # float32 is more than enough for the colors, and halves the memory moved through the drawing
+    data, quantiles = anomaly_and_quantiles(
+        np.ascontiguousarray(cpc_da.values, dtype=np.float32),
+        np.ascontiguousarray(cpc_clim_da.values, dtype=np.float32),
+        [0.02, 0.98],
+    )
+    vmax = round(max(abs(quantiles[0]), abs(quantiles[1])))
 
     print(data.shape, lat.shape, lon.shape)  # Out: (12, 80, 130) (80,) (130,)
 
-    for i, dt in enumerate(pd.date_range(date(2020, 8, 1), date(2021, 7, 31), freq="MS")):
-        draw_contourf_map(
-            lat=lat,
-            lon=lon,
-            data=data[i, ...],
-            region_bbbox=(72, 137, 15, 55),
-            title=f"Diff {factor} {dt.strftime('%Y%m')}",
-            img_path=f"images/{factor}_diff_{dt.strftime('%Y%m')}.png",
-            figure_kw={"dpi": 144, "figsize": (12, 9)},
-            contour_kw={
-                "levels": np.linspace(-vmax, vmax, 17),
-                "vmin": -vmax,
-                "vmax": vmax,
-                "cmap": cmaps.BlueWhiteOrangeRed_r,
-                "extend": "both",
-            },
-        )
+    # the region, grid, levels and colormap are the same for all the months, so they are drawn as the panels of one
+    # figure sharing one colorbar, which is created and saved only once
+    stamps = pd.date_range(date(2020, 8, 1), date(2021, 7, 31), freq="MS").strftime("%Y%m").tolist()
+    levels, cmap = np.linspace(-vmax, vmax, 17), cmaps.BlueWhiteOrangeRed_r
+    draw_contourf_grid(
+        lat,
+        lon,
+        data,
+        titles=stamps,
+        ncols=4,
+        region_bbbox=(72, 137, 15, 55),
+        suptitle=f"Diff {factor} {stamps[0]}-{stamps[-1]}",
+        img_path=f"images/{factor}_diff_{stamps[0]}-{stamps[-1]}.png",
+        contour_kw={"levels": levels, "cmap": cmap, "extend": "both"},
+        # the norm of the fixed levels is built once and shared by all the months
+        norm=BoundaryNorm(levels, cmap.N, extend="both"),
+        use_pcolormesh=True,  # the PNG is raster anyway
+    )
 
 
 def precip_demo():
@@ -62,33 +213,28 @@ def precip_demo():
     xmin, xmax, ymin, ymax = 72, 137, 15, 55
     cpc_da = read_monthly_cpc(
         factor, date(2020, 8, 1), date(2021, 7, 31), lat_range=(ymin, ymax), lon_range=(xmin, xmax)
-    ).to_array()
-
-    # compute maximum value, the minimum should be 0
-    cpc_quantile_da = cpc_da.quantile(0.98, keep_attrs=False)
-    vmax = math.ceil(round(cpc_quantile_da.item()) / 2) * 2
+    )[factor]
 
     lat, lon = cpc_da.lat.values, cpc_da.lon.values
-    data = cpc_da.values.squeeze()
+    data = np.ascontiguousarray(cpc_da.values, dtype=np.float32)  # float32 is more than enough for the colors
+
+    # compute maximum value, the minimum should be 0
+    vmax = math.ceil(round(_nan_quantile(data, 0.98)) / 2) * 2
     print(data.shape, lat.shape, lon.shape)  # Out: (12, 80, 130) (80,) (130,)
 
-    for i, dt in enumerate(pd.date_range(date(2020, 8, 1), date(2021, 7, 31), freq="MS")):
-        draw_contourf_map(
-            lat=lat,
-            lon=lon,
-            data=data[i, ...],
-            region_bbbox=(72, 137, 15, 55),
-            title=f"Diff {factor} {dt.strftime('%Y%m')}",
-            img_path=f"images/{factor}_{dt.strftime('%Y%m')}.png",
-            figure_kw={"dpi": 144, "figsize": (12, 9)},
-            contour_kw={
-                "levels": np.linspace(0, vmax, 15),
-                "vmin": 0,
-                "vmax": vmax,
-                "cmap": cmaps.MPL_YlGnBu,
-                "extend": "max",
-            },
-            feature_kw={
+    stamps = pd.date_range(date(2020, 8, 1), date(2021, 7, 31), freq="MS").strftime("%Y%m").tolist()
+    stamps = stamps[:1]  # only the first month is drawn, remove the line to draw all the months
+    levels, cmap = np.linspace(0, vmax, 15), cmaps.MPL_YlGnBu
+    render_months_parallel(
+        lat,
+        lon,
+        data[: len(stamps), ...],
+        titles=[f"Diff {factor} {stamp}" for stamp in stamps],
+        img_paths=[f"images/{factor}_{stamp}.png" for stamp in stamps],
+        canvas_kw={
+            "region_bbbox": (72, 137, 15, 55),
+            "figure_kw": {"dpi": 144, "figsize": (12, 9)},
+            "feature_kw": {
                 # "STATES": {
                 #     "linewidth": 0.15,
                 #     "edgecolor": "dimgray"
@@ -99,9 +245,11 @@ def precip_demo():
                 # },
                 "RIVERS": {"linewidth": 0.3, "edgecolor": "blue"}
             },
-        )
-
-        break
+        },
+        contour_kw={"levels": levels, "cmap": cmap, "extend": "max"},
+        norm=BoundaryNorm(levels, cmap.N, extend="max"),
+        use_pcolormesh=True,
+    )
 
 
 if __name__ == "__main__":
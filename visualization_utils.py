@@ -4,20 +4,68 @@ A visualization utility module
 
 Function list:
 - draw_contourf_map: A quite flexible function to draw a contour (choropleth) map
+- make_map_canvas: Create the figure and map axes (extent, features, ticks) to draw contour maps on
+- update_contourf: Draw the contour of new data on a map canvas, replacing the previous contour
+- add_colorbar: Add the colorbar of a contour on the right side of the map axes
+- draw_contourf_grid: Draw the contour maps of a stack of data as the panels of one figure, sharing one colorbar
 """
 import math
+from functools import lru_cache
 from pathlib import Path
-from typing import Tuple
+from typing import List, Tuple, Union
 
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
+import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
+from cartopy.mpl.geoaxes import GeoAxes
 from cartopy.mpl.ticker import LatitudeFormatter, LongitudeFormatter
 from cartopy.util import add_cyclic_point
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import QuadMesh
+from matplotlib.colorbar import Colorbar
+from matplotlib.colors import BoundaryNorm, Normalize
+from matplotlib.contour import QuadContourSet
 from matplotlib.figure import Figure
+from matplotlib.ticker import MaxNLocator
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
+# the natural earth features that can be drawn on the maps, in drawing order
+_FEATURE_NAMES = ("COASTLINE", "BORDERS", "STATES", "RIVERS", "LAKES")
+# the map canvases reused by `draw_contourf_map(reuse_canvas=True)`, keyed by the arguments of `make_map_canvas`, each
+# value is (fig, ax, artists) where `artists` are the colorbar axes and the contour drawn on it last time (in the order
+# to remove them)
+_CANVAS_CACHE = {}
+_CANVAS_CACHE_SIZE = 16
+
+
+@lru_cache(maxsize=None)
+def _get_feature(name: str) -> cfeature.Feature:
+    """Get the 10m natural earth feature `name` of cartopy (like COASTLINE, BORDERS), whose geometries are read once and cached, so that the shapefile is not read again by every drawn map"""
+    feature = getattr(cfeature, name).with_scale("10m")
+    return cfeature.ShapelyFeature(list(feature.geometries()), feature.crs, **feature.kwargs)
+
+
+def _freeze(kw: dict):
+    """Convert the (nested) keyword arguments `kw` into sorted item tuples, so that they can be hashed as a cache key"""
+    if not isinstance(kw, dict):
+        return kw
+    return tuple(sorted((k, _freeze(v)) for k, v in kw.items()))
+
+
+def _region_bbox(lat: np.ndarray, lon: np.ndarray, region_bbbox: Tuple[float] = None) -> Tuple[float]:
+    """Return `region_bbbox` if provided, otherwise the bbox (lon_min, lon_max, lat_min, lat_max) covering `lat` and `lon` with integer degrees"""
+    if region_bbbox:
+        return tuple(region_bbbox)
+    return math.floor(lon.min()), math.ceil(lon.max()), math.floor(lat.min()), math.ceil(lat.max())
+
+
+def _ticks(vmin: float, vmax: float, n: int) -> list:
+    """Return about `n` ticks from `vmin` to `vmax` (inclusive) with a rounded step, the same as `np.arange(vmin, vmax + 1, np.round((vmax + 1 - vmin) / n))` but in pure python for the few ticks"""
+    step = max(1, round((vmax + 1 - vmin) / n))
+    return [vmin + i * step for i in range(math.ceil((vmax + 1 - vmin) / step))]
+
 
 def draw_contourf_map(
     lat: np.ndarray,
@@ -33,6 +81,10 @@ def draw_contourf_map(
     savefig_kw: dict = None,
     central_longitude: float = 0,
     add_cyclic_lons: bool = False,
+    rasterize_contour: bool = True,
+    norm: Normalize = None,
+    use_pcolormesh: bool = False,
+    reuse_canvas: bool = False,
 ) -> Figure:
     """A quite flexible function to draw a contour (choropleth) map, the exposed arguments `figsize_kw`, `contour_kw` and `savefig_kw` provide the user enough control to
 
@@ -48,23 +100,111 @@ def draw_contourf_map(
         title (str, optional): [description]. Titile of the figure, Defaults to None
         img_path (Path, optional): If provided, the figure will be saved into file of given path. Defaults to None
         faature_kw (dict, optional): Arguments for ploting COASTLINES, BOARDERS, STATES, like linewidth, edgecolor, facecolor etc, if the value is None instead of a dict, the feature will not be plotted. Default is { "COASTLINE": { "linewidth": 0.25 }, "BORDERS": { "linewidth": 0.25 }, "STATES": None}
-        figure_kw (dict, optional): Arguments for figure. Defaults to None means {"dpi": 144, "figsize": (9.6, 7.2), "tight_layout": True}. See class (`matplotlib.figure.Figure` documentation)[https://matplotlib.org/stable/api/figure_api.html#matplotlib.figure.Figure] for supported arguments
-        contour_kw (dict, optional): Arguments to override the default arguments {"levels": 20, "cmap": plt.cm.Blues} input into function (Axes.contourf)[https://matplotlib.org/stable/api/_as_gen/matplotlib.axes.Axes.contourf.html?highlight=contourf#matplotlib.axes.Axes.contourf]. Defaults to None. Check the link For a complete list of supported paramters
-        savefig_kw (dict, optional): Arguments to override the default arguments {"bbox_inches", "tight"} input into function (savefig)[https://matplotlib.org/stable/api/figure_api.html?highlight=savefig#matplotlib.figure.Figure.savefig]. Only works when `img_path` is provided. Defaults to None. Check the link For a complete list of supported paramters
+        figure_kw (dict, optional): Arguments for figure. Defaults to None means {"dpi": 144, "figsize": (9.6, 7.2), "tight_layout": False}. The tight layout is off since it recomputes the extents of all the artists (like the projected coastlines) at every draw, and the margins are trimmed by `bbox_inches="tight"` when saving anyway. See class (`matplotlib.figure.Figure` documentation)[https://matplotlib.org/stable/api/figure_api.html#matplotlib.figure.Figure] for supported arguments
+        contour_kw (dict, optional): Arguments to override the default arguments {"levels": 20, "cmap": plt.cm.Blues, "algorithm": "serial"} input into function (Axes.contourf)[https://matplotlib.org/stable/api/_as_gen/matplotlib.axes.Axes.contourf.html?highlight=contourf#matplotlib.axes.Axes.contourf]. Defaults to None. Check the link For a complete list of supported paramters
+        savefig_kw (dict, optional): Arguments to override the default arguments {"bbox_inches": "tight", "dpi": <dpi of the figure>} (and {"pil_kwargs": {"compress_level": 1}} for PNG) input into function (savefig)[https://matplotlib.org/stable/api/figure_api.html?highlight=savefig#matplotlib.figure.Figure.savefig]. Only works when `img_path` is provided. Defaults to None. Check the link For a complete list of supported paramters
         central_longitude (float): central longitude of projection PlateCarree
         add_cyclic_lons (bool): Whether to add cyclic point on longitude direction
+        rasterize_contour (bool): Whether to rasterize the filled contour (at the dpi of the figure) when saved into vector formats like SVG and PDF, while the texts and axes stay vector. Otherwise each filled polygon of each level is written as a vector path, which makes the file huge and slow to write
+        norm (Normalize, optional): The normalization of the data into the colormap, like a `matplotlib.colors.BoundaryNorm` of the levels. It can be built once and shared by the maps of the same levels and colormap. If provided, `vmin` and `vmax` in `contour_kw` are ignored. Defaults to None
+        use_pcolormesh (bool, optional): Whether to draw the grid cells colored by the bins of the levels with `pcolormesh` instead of the filled contour. It looks much the same on the raster outputs (like PNG) but skips computing the contour polygons, which is the dominant cost of drawing. Only the `levels`, `cmap` and `extend` of `contour_kw` are used. Defaults to False
+        reuse_canvas (bool, optional): Whether to reuse the map canvas (figure with the features and ticks) cached by the previous calls with the same region bbox, `feature_kw`, `figure_kw` and `central_longitude`, only the contour, colorbar and title are redrawn. NOTE the returned figure is then shared and will be redrawn by the next such call, save or copy it before that. Defaults to False
 
     Returns:
         Figure: The instance of the Figure
     """
+    canvas_kw = {
+        "region_bbbox": _region_bbox(lat, lon, region_bbbox),
+        "feature_kw": feature_kw,
+        "figure_kw": figure_kw,
+        "central_longitude": central_longitude,
+    }
+    canvas_key = None
+    if reuse_canvas:
+        canvas_key = _freeze(canvas_kw)
+        try:
+            hash(canvas_key)
+        except TypeError:  # unhashable arguments, like a list of values, draw on a new canvas
+            canvas_key = None
+    if canvas_key is not None and canvas_key in _CANVAS_CACHE:
+        fig, ax, artists = _CANVAS_CACHE[canvas_key]
+        for artist in artists:
+            artist.remove()
+        artists.clear()
+        ax.set_title(title)
+    else:
+        fig, ax = make_map_canvas(lat, lon, title=title, **canvas_kw)
+        artists = []
+        if canvas_key is not None:
+            if len(_CANVAS_CACHE) >= _CANVAS_CACHE_SIZE:  # drop the oldest canvas
+                _CANVAS_CACHE.pop(next(iter(_CANVAS_CACHE)))
+            _CANVAS_CACHE[canvas_key] = (fig, ax, artists)
+    cf = update_contourf(
+        ax,
+        lat,
+        lon,
+        data,
+        contour_kw=contour_kw,
+        add_cyclic_lons=add_cyclic_lons,
+        rasterize_contour=rasterize_contour,
+        norm=norm,
+        use_pcolormesh=use_pcolormesh,
+    )
+    cbar = add_colorbar(fig, ax, cf, cbar_kw=cbar_kw)
+    # the colorbar is removed before its contour, since removing the colorbar axes reads the axes of the contour
+    artists.extend([cbar.ax, cf])
+    # return / show / save
+    if img_path:
+        savefig_kw_def = {"bbox_inches": "tight", "dpi": fig.dpi}
+        if Path(img_path).suffix.lower() == ".png":
+            # zlib level 1 encodes several times faster than the default 6, the file is only a few percent larger
+            savefig_kw_def["pil_kwargs"] = {"compress_level": 1}
+        if savefig_kw:
+            savefig_kw_def.update(savefig_kw)
+        fig.savefig(img_path, **savefig_kw_def)
+    return fig
+
+
+def make_map_canvas(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    region_bbbox: Tuple[float] = None,
+    title: str = None,
+    feature_kw: dict = None,
+    figure_kw: dict = None,
+    central_longitude: float = 0,
+) -> Tuple[Figure, GeoAxes]:
+    """Create the figure and the map axes with the region extent, map features and ticks. The contours of a series of data on the same grid can be drawn on it one after another by `update_contourf`, which saves most of the time of drawing each map from scratch
+
+    Args:
+        lat (np.ndarray): same as in `draw_contourf_map`
+        lon (np.ndarray): same as in `draw_contourf_map`
+        region_bbbox (Tuple[float], optional): same as in `draw_contourf_map`
+        title (str, optional): same as in `draw_contourf_map`
+        feature_kw (dict, optional): same as in `draw_contourf_map`
+        figure_kw (dict, optional): same as in `draw_contourf_map`
+        central_longitude (float, optional): same as in `draw_contourf_map`
 
+    Returns:
+        Tuple[Figure, GeoAxes]: The instance of the Figure and the map axes
+    """
     # parameters
-    if region_bbbox:
-        xmin, xmax, ymin, ymax = region_bbbox
-    else:
-        xmin, xmax = math.floor(lon.min()), math.ceil(lon.max())
-        ymin, ymax = math.floor(lat.min()), math.ceil(lat.max())
+    figure_kw_def = {"dpi": 144, "figsize": (9.6, 7.2), "tight_layout": False}
+    if figure_kw:
+        figure_kw_def.update(figure_kw)
+
+    # create figure and axes, the figure is not managed by pyplot (so it needs no `plt.close`) and is drawn by Agg
+    proj = ccrs.PlateCarree(central_longitude=central_longitude)
+    fig = Figure(**figure_kw_def)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(projection=proj, title=title)
+    _decorate_map_axes(ax, _region_bbox(lat, lon, region_bbbox), feature_kw)
+    return fig, ax
 
+
+def _decorate_map_axes(ax: GeoAxes, region_bbbox: Tuple[float], feature_kw: dict = None):
+    """Set the extent `region_bbbox`, the map features and the ticks of the map axes `ax`, see `draw_contourf_map` for `feature_kw`"""
+    xmin, xmax, ymin, ymax = region_bbbox
     feature_kw_def = {
         "COASTLINE": {"linewidth": 0.25},
         "BORDERS": {"linewidth": 0.25},
@@ -75,63 +215,178 @@ def draw_contourf_map(
     if feature_kw:
         feature_kw_def.update(feature_kw)
 
-    figure_kw_def = {"dpi": 144, "figsize": (9.6, 7.2), "tight_layout": True}
-    if figure_kw:
-        figure_kw_def.update(figure_kw)
-
-    contour_kw_def = {"levels": 20, "cmap": plt.cm.Blues}
-    if contour_kw:
-        contour_kw_def.update(contour_kw)
-
-    cbar_kw_def = {}
-    if cbar_kw:
-        cbar_kw_def.update(cbar_kw)
-
-    # create figure and axes
-    proj = ccrs.PlateCarree(central_longitude=central_longitude)
-    fig, ax = plt.subplots(
-        subplot_kw={"projection": proj, "title": title},
-        **figure_kw_def,
-    )
     # plot range and fatures
     ax.set_extent((xmin, xmax, ymin, ymax), ccrs.PlateCarree())
-    if feature_kw_def["COASTLINE"] is not None:
-        ax.add_feature(cfeature.COASTLINE.with_scale("10m"), **feature_kw_def["COASTLINE"])
-    if feature_kw_def["BORDERS"] is not None:
-        ax.add_feature(cfeature.BORDERS.with_scale("10m"), **feature_kw_def["BORDERS"])
-    if feature_kw_def["STATES"] is not None:
-        ax.add_feature(cfeature.STATES.with_scale("10m"), **feature_kw_def["STATES"])
-    if feature_kw_def["RIVERS"] is not None:
-        ax.add_feature(cfeature.RIVERS.with_scale("10m"), **feature_kw_def["RIVERS"])
-    if feature_kw_def["LAKES"] is not None:
-        ax.add_feature(cfeature.LAKES.with_scale("10m"), **feature_kw_def["LAKES"])
+    for name in _FEATURE_NAMES:
+        if feature_kw_def.get(name) is not None:
+            ax.add_feature(_get_feature(name), **feature_kw_def[name])
     # ticks and ticklabels
-    ax.set_xticks(
-        np.arange(xmin, xmax + 1, np.round((xmax + 1 - xmin) / 8)),
-        crs=ccrs.PlateCarree(),
-    )
-    ax.set_yticks(
-        np.arange(ymin, ymax + 1, np.round((ymax + 1 - ymin) / 5)),
-        crs=ccrs.PlateCarree(),
-    )
+    ax.set_xticks(_ticks(xmin, xmax, 8), crs=ccrs.PlateCarree())
+    ax.set_yticks(_ticks(ymin, ymax, 5), crs=ccrs.PlateCarree())
     lon_formatter = LongitudeFormatter(zero_direction_label=True)
     lat_formatter = LatitudeFormatter()
     ax.xaxis.set_major_formatter(lon_formatter)
     ax.yaxis.set_major_formatter(lat_formatter)
+
+
+def update_contourf(
+    ax: GeoAxes,
+    lat: np.ndarray,
+    lon: np.ndarray,
+    data: np.ndarray,
+    prev_cf: Union[QuadContourSet, QuadMesh] = None,
+    contour_kw: dict = None,
+    add_cyclic_lons: bool = False,
+    rasterize_contour: bool = True,
+    norm: Normalize = None,
+    use_pcolormesh: bool = False,
+) -> Union[QuadContourSet, QuadMesh]:
+    """Draw the contour (or the mesh if `use_pcolormesh`) of `data` on the map axes `ax` created by `make_map_canvas`, the previous contour `prev_cf` is removed first if given
+
+    Args:
+        ax (GeoAxes): The map axes
+        lat (np.ndarray): same as in `draw_contourf_map`
+        lon (np.ndarray): same as in `draw_contourf_map`
+        data (np.ndarray): same as in `draw_contourf_map`
+        prev_cf (Union[QuadContourSet, QuadMesh], optional): The previous contour (or mesh) to replace. Defaults to None
+        contour_kw (dict, optional): same as in `draw_contourf_map`
+        add_cyclic_lons (bool, optional): same as in `draw_contourf_map`
+        rasterize_contour (bool, optional): same as in `draw_contourf_map`
+        norm (Normalize, optional): same as in `draw_contourf_map`
+        use_pcolormesh (bool, optional): same as in `draw_contourf_map`
+
+    Returns:
+        Union[QuadContourSet, QuadMesh]: The drawn contour (or mesh)
+    """
+    # the "serial" algorithm of contourpy is about 2x faster than the default "mpl2014" with the same output
+    contour_kw_def = {"levels": 20, "cmap": plt.cm.Blues, "algorithm": "serial"}
+    if contour_kw:
+        contour_kw_def.update(contour_kw)
+    if norm is not None:  # `vmin` and `vmax` conflict with the given norm
+        contour_kw_def.pop("vmin", None)
+        contour_kw_def.pop("vmax", None)
+        contour_kw_def["norm"] = norm
+
+    if prev_cf is not None:
+        prev_cf.remove()
     # contour(f)
     if add_cyclic_lons:
         data, lon = add_cyclic_point(data, coord=lon)
+    if use_pcolormesh:
+        levels, cmap = contour_kw_def["levels"], contour_kw_def["cmap"]
+        if isinstance(cmap, str):  # the colormap name like "RdBu", which contourf accepts as well
+            cmap = matplotlib.colormaps[cmap]
+        if np.ndim(levels) == 0:  # the number of levels, chosen like contourf does
+            levels = MaxNLocator(levels + 1).tick_values(np.nanmin(data), np.nanmax(data))
+        if norm is None:
+            norm = BoundaryNorm(levels, cmap.N, extend=contour_kw_def.get("extend", "neither"))
+        cf = ax.pcolormesh(lon, lat, data, cmap=cmap, norm=norm, shading="nearest", transform=ccrs.PlateCarree())
+        if rasterize_contour:
+            cf.set_rasterized(True)
+        return cf
+    # the 1D coordinates of the rectilinear grid are passed directly, no meshgrid is needed
     cf = ax.contourf(lon, lat, data, transform=ccrs.PlateCarree(), **contour_kw_def)
-    # colorbar
+    if rasterize_contour:
+        cf.set_rasterized(True)
+    return cf
+
+
+def add_colorbar(fig: Figure, ax: GeoAxes, cf: Union[QuadContourSet, QuadMesh], cbar_kw: dict = None) -> Colorbar:
+    """Add the colorbar of the contour (or mesh) `cf` on the right side of the map axes `ax`. The contours sharing the same levels and colormap on a canvas only need one colorbar
+
+    Args:
+        fig (Figure): The instance of the Figure
+        ax (GeoAxes): The map axes
+        cf (Union[QuadContourSet, QuadMesh]): The contour (or mesh)
+        cbar_kw (dict, optional): same as in `draw_contourf_map`
+
+    Returns:
+        Colorbar: The colorbar, whose axes is `.ax`
+    """
+    cbar_kw_def = {}
+    if cbar_kw:
+        cbar_kw_def.update(cbar_kw)
+
     divider = make_axes_locatable(ax)
     cax = divider.new_horizontal(size="3.3%", pad=0.05, axes_class=plt.Axes)
     fig.add_axes(cax)
-    fig.colorbar(cf, cax=cax, **cbar_kw_def)
-    # return / show / save
+    return fig.colorbar(cf, cax=cax, **cbar_kw_def)
+
+
+def draw_contourf_grid(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    data: np.ndarray,
+    titles: List[str] = None,
+    ncols: int = 4,
+    region_bbbox: Tuple[float] = None,
+    suptitle: str = None,
+    img_path: Path = None,
+    feature_kw: dict = None,
+    figure_kw: dict = None,
+    contour_kw: dict = None,
+    cbar_kw: dict = None,
+    savefig_kw: dict = None,
+    central_longitude: float = 0,
+    norm: Normalize = None,
+    use_pcolormesh: bool = False,
+) -> Figure:
+    """Draw the contour maps of a stack of data (like the months of a year) as the panels of one figure, which share one colorbar. Compared with one figure per map by `draw_contourf_map`, the figure creation and the image encoding are done only once
+
+    Args:
+        lat (np.ndarray): Latitude coordination vectors of shape (n_lat, )
+        lon (np.ndarray): Longitude coordination vectors of shape (n_lon, )
+        data (np.ndarray): Stack of 2D data of shape (n_maps, n_lat, n_lon)
+        titles (List[str], optional): Titles of the panels. Defaults to None
+        ncols (int, optional): Number of the panel columns, the number of rows is deduced from the number of maps. Defaults to 4
+        region_bbbox (Tuple[float], optional): same as in `draw_contourf_map`
+        suptitle (str, optional): Title of the whole figure. Defaults to None
+        img_path (Path, optional): same as in `draw_contourf_map`
+        feature_kw (dict, optional): same as in `draw_contourf_map`
+        figure_kw (dict, optional): Arguments for figure. Defaults to None means {"dpi": 144, "figsize": (4.8 * ncols, 3.6 * nrows)}, see `draw_contourf_map`
+        contour_kw (dict, optional): same as in `draw_contourf_map`, the levels should be given as values so that all the panels share them
+        cbar_kw (dict, optional): same as in `draw_contourf_map`
+        savefig_kw (dict, optional): same as in `draw_contourf_map`
+        central_longitude (float): same as in `draw_contourf_map`
+        norm (Normalize, optional): same as in `draw_contourf_map`
+        use_pcolormesh (bool, optional): same as in `draw_contourf_map`
+
+    Returns:
+        Figure: The instance of the Figure
+    """
+    n_maps = len(data)
+    if n_maps == 0:
+        raise ValueError("No map to draw, the stack of data is empty")
+    ncols = min(ncols, n_maps)
+    nrows = math.ceil(n_maps / ncols)
+    figure_kw_def = {"dpi": 144, "figsize": (4.8 * ncols, 3.6 * nrows)}
+    if figure_kw:
+        figure_kw_def.update(figure_kw)
+    cbar_kw_def = {"shrink": 0.8}
+    if cbar_kw:
+        cbar_kw_def.update(cbar_kw)
+
+    proj = ccrs.PlateCarree(central_longitude=central_longitude)
+    fig = Figure(**figure_kw_def)
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(nrows, ncols, squeeze=False, subplot_kw={"projection": proj})
+    bbox = _region_bbox(lat, lon, region_bbbox)
+    for i, ax in enumerate(axes.flat):
+        if i >= n_maps:  # the empty panels of the last row
+            ax.remove()
+            continue
+        _decorate_map_axes(ax, bbox, feature_kw)
+        cf = update_contourf(ax, lat, lon, data[i], contour_kw=contour_kw, norm=norm, use_pcolormesh=use_pcolormesh)
+        if titles is not None:
+            ax.set_title(titles[i])
+    fig.colorbar(cf, ax=axes.flat[:n_maps].tolist(), **cbar_kw_def)
+    if suptitle:
+        fig.suptitle(suptitle)
     if img_path:
-        savefig_kw_def = {"bbox_inches": "tight"}
+        savefig_kw_def = {"bbox_inches": "tight", "dpi": fig.dpi}
+        if Path(img_path).suffix.lower() == ".png":
+            savefig_kw_def["pil_kwargs"] = {"compress_level": 1}
         if savefig_kw:
             savefig_kw_def.update(savefig_kw)
         fig.savefig(img_path, **savefig_kw_def)
-    plt.close()
     return fig